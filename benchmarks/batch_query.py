@@ -0,0 +1,68 @@
+"""Compare the original per-action memory queries against one batched query as the action count grows.
+
+For the vw engine the per-action loop builds every example with VowpalMediator.make_example (as
+EMT did before batching) so the context is prepared and hashed again for each action. VW's emt
+reduction predicts one example per call so its batch only saves example construction, which is
+timed on its own since VW's tree query dominates end-to-end. For the numpy engine the loop is
+one EMT.predict per action while the batch builds every action's vector from one context vector
+and routes and scores all of them together.
+
+Run from the repository root with `python -m benchmarks.batch_query`.
+"""
+
+import time
+
+from coba.random import CobaRandom
+
+from learners import EMT
+
+n_memories = 2_000
+n_queries  = 100
+n_features = 20
+n_actions  = [2, 8, 32, 128, 512]
+
+def make_memory(rng: CobaRandom, engine: str) -> EMT:
+    mem = EMT(split=100, scorer="self_consistent_rank", router="eigen", interactions=["xa"], engine=engine)
+    mem.set_params(['0','1'])
+
+    for _ in range(n_memories):
+        context = tuple(rng.randoms(n_features))
+        action  = str(rng.randint(0,max(n_actions)))
+        mem.learn({'x':context,'a':action}, str(rng.randint(0,1)), 1)
+
+    return mem
+
+def best_of(func, contexts, repeats: int = 3) -> float:
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for context in contexts: func(context)
+        times.append((time.perf_counter()-start)/len(contexts))
+    return min(times)
+
+if __name__ == '__main__':
+
+    for engine in ["vw", "numpy"]:
+
+        rng = CobaRandom(1)
+        mem = make_memory(rng, engine)
+
+        print(f"\n{engine}")
+        print(f"{'actions':>8} {'loop build':>11} {'batch build':>12} {'loop (ms)':>10} {'batch (ms)':>11} {'speedup':>8}")
+
+        for n in n_actions:
+            actions  = [ str(a) for a in range(n) ]
+            contexts = [ tuple(rng.randoms(n_features)) for _ in range(n_queries) ]
+
+            if engine == "vw":
+                loop_build  = best_of(lambda c: [ mem._vw.make_example({'x':c,'a':a}, None) for a in actions ], contexts)
+                batch_build = best_of(lambda c: [ mem._make_example({'x':c,'a':a}, None) for a in actions ], contexts)
+                loop_time   = best_of(lambda c: [ mem._vw.predict(mem._vw.make_example({'x':c,'a':a}, None)) for a in actions ], contexts)
+            else:
+                loop_build  = best_of(lambda c: [ mem._make_example({'x':c,'a':a}, None) for a in actions ], contexts)
+                batch_build = best_of(lambda c: mem._vw.make_batch({'x':mem._cache.get('x',c,mem._hash)}, [ {'a':mem._cache.get('a',a,mem._hash)} for a in actions ]), contexts)
+                loop_time   = best_of(lambda c: [ mem.predict({'x':c,'a':a}) for a in actions ], contexts)
+
+            batch_time = best_of(lambda c: mem.predict_batch(c, actions), contexts)
+
+            print(f"{n:>8} {1000*loop_build:>11.3f} {1000*batch_build:>12.3f} {1000*loop_time:>10.3f} {1000*batch_time:>11.3f} {loop_time/batch_time:>8.2f}")
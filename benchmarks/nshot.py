@@ -0,0 +1,73 @@
+"""Compare the single pass NShot sampler against the original sort based sampler.
+
+Both samplers must give the same rows in the same order for the same seed.
+
+Run from the repository root with `python -m benchmarks.nshot`.
+"""
+
+import time
+import bisect
+
+import coba as cb
+
+from run_few_shot import NShot
+
+n_shot    = 5
+n_classes = [100, 1_000, 10_000]
+n_per     = 10
+
+class Label:
+    def __init__(self, label: int) -> None:
+        self._label = label
+
+    def argmax(self) -> int:
+        return self._label
+
+class SortedNShot:
+    """The original NShot sampler which sorts the stream and finds classes with bisect."""
+
+    def __init__(self, n, seed) -> None:
+        self._n = n
+        self._seed = seed
+
+    def filter(self, interactions):
+
+        rng = cb.CobaRandom(self._seed)
+        get_label = lambda i: i['rewards'].argmax()
+
+        interactions  = sorted(interactions, key=get_label)
+        class_indexes = []
+
+        lo = 0
+        hi = len(interactions)
+
+        while lo != hi:
+            new_lo = bisect.bisect_right(interactions, get_label(interactions[lo]), lo, hi, key=get_label)
+            class_indexes.append(rng.shuffle(list(range(lo,new_lo)),inplace=True))
+            lo = new_lo
+
+        for _ in range(self._n):
+            for indexes in rng.shuffle(class_indexes,inplace=True):
+                yield interactions[indexes.pop()]
+
+if __name__ == '__main__':
+
+    rng = cb.CobaRandom(1)
+
+    print(f"{'classes':>8} {'rows':>8} {'sorted (s)':>11} {'bucket (s)':>11} {'speedup':>8} {'same':>5}")
+
+    for k in n_classes:
+        labels       = rng.shuffle([ c for c in range(k) for _ in range(n_per) ])
+        interactions = [ {'context': i, 'rewards': Label(c)} for i,c in enumerate(labels) ]
+
+        start      = time.perf_counter()
+        old        = [ i['context'] for i in SortedNShot(n_shot,1).filter(iter(interactions)) ]
+        old_time   = time.perf_counter()-start
+
+        start      = time.perf_counter()
+        new        = [ i['context'] for i in NShot(n_shot,1).filter(iter(interactions)) ]
+        new_time   = time.perf_counter()-start
+
+        print(f"{k:>8} {len(interactions):>8} {old_time:>11.3f} {new_time:>11.3f} {old_time/new_time:>8.2f} {str(old==new):>5}")
+
+        assert old == new, f"NShot no longer matches the sort based sampler with {k} classes."
@@ -0,0 +1,199 @@
+"""Measure how memory query and insert latency grow with the number of memories.
+
+Each learner is fed one synthetic classification stream. Every example is first queried
+and then inserted, and both operations are timed. Latencies are summarized over each
+window between checkpoints (e.g., examples 10,000 to 100,000) so the rows show cost as
+a function of n. An O(log n) memory should have a `slope` (the log-log slope of mean
+latency against n) near 0, while a linear scan has a slope near 1.
+
+Run from the repository root with `python -m benchmarks.scaling`. Results are written as
+JSON and can be checked for regressions against an earlier run with `--compare`:
+
+    python -m benchmarks.scaling --out results/scaling.json
+    python -m benchmarks.scaling --out results/scaling_new.json --compare results/scaling.json
+"""
+
+import sys
+import json
+import time
+import platform
+import argparse
+import subprocess
+from math import log
+from time import perf_counter_ns
+from typing import Iterable, Iterator, Mapping, Sequence, Tuple, Any, List
+
+import numpy as np
+
+from learners import VWC, EMT, CMT
+from learners.profiling import LatencyHistogram
+
+def synthetic_stream(n: int, dim: int, classes: int, noise: float = 0.5, seed: int = 1) -> Iterator[Tuple[tuple,str]]:
+    """Yield n (features,label) pairs drawn from one gaussian blob per class."""
+    rng       = np.random.default_rng(seed)
+    centroids = rng.random((classes,dim))
+
+    for start in range(0, n, 10_000):
+        size   = min(10_000, n-start)
+        labels = rng.integers(classes, size=size)
+        X      = centroids[labels] + noise*rng.standard_normal((size,dim))/dim**.5
+
+        for x, y in zip(X.round(4).tolist(), labels.tolist()):
+            yield tuple(x), str(y)
+
+def make_learners(names: Sequence[str], splits: Sequence[int], bounds: Sequence[int]) -> Iterable[Tuple[Mapping[str,Any],VWC]]:
+    """The learners to benchmark along with the settings that identify them in the results."""
+    for name in names:
+        if name == "emt":
+            for split in splits:
+                for bound in bounds:
+                    yield {'learner':'EMT', 'split':split, 'bound':bound}, EMT(split=split, bound=bound)
+        elif name == "emt-numpy":
+            for split in splits:
+                for bound in bounds:
+                    yield {'learner':'EMT-numpy', 'split':split, 'bound':bound}, EMT(split=split, bound=bound, engine="numpy")
+        elif name == "cmt":
+            for split in splits:
+                yield {'learner':'CMT', 'split':split, 'bound':0}, CMT(mems_per_leaf=split, max_nodes=2**16)
+        elif name == "oaa":
+            yield {'learner':'OAA', 'split':0, 'bound':0}, VWC("--oaa {} --quiet --random_seed 1")
+        else:
+            raise ValueError(f"Unknown learner {name}.")
+
+def summarize(histogram: LatencyHistogram) -> Mapping[str,float]:
+    return { 'mean_us': histogram.mean/1000, 'p50_us': histogram.percentile(50)/1000, 'p99_us': histogram.percentile(99)/1000 }
+
+def run(learner: VWC, checkpoints: Sequence[int], dim: int, classes: int) -> Iterator[Mapping[str,Any]]:
+    """Stream examples through a learner and yield one row per checkpoint window."""
+    learner.set_params([str(c) for c in range(classes)])
+
+    predict, learn = LatencyHistogram(), LatencyHistogram()
+    window_start   = time.perf_counter()
+    correct        = 0
+    n_window       = 0
+    checkpoint     = iter(checkpoints)
+    next_n         = next(checkpoint)
+
+    for n, (x, y) in enumerate(synthetic_stream(max(checkpoints), dim, classes), 1):
+        features = {'x': x}
+
+        start = perf_counter_ns()
+        pred  = learner.predict(features)
+        mid   = perf_counter_ns()
+        learner.learn(features, y, 1)
+        end   = perf_counter_ns()
+
+        predict.record(mid-start)
+        learn.record(end-mid)
+        correct  += pred == y
+        n_window += 1
+
+        if n == next_n:
+            seconds = time.perf_counter()-window_start
+            yield {
+                'n'             : n,
+                'examples'      : n_window,
+                'accuracy'      : correct/n_window,
+                'throughput_eps': n_window/seconds,
+                **{ f"predict_{k}": v for k,v in summarize(predict).items() },
+                **{ f"learn_{k}"  : v for k,v in summarize(learn).items() },
+            }
+
+            predict, learn = LatencyHistogram(), LatencyHistogram()
+            window_start   = time.perf_counter()
+            correct        = 0
+            n_window       = 0
+            next_n         = next(checkpoint, None)
+
+def slope(rows: Sequence[Mapping[str,Any]], key: str) -> float:
+    """The least squares slope of log(key) against log(n)."""
+    points = [ (log(r['n']), log(r[key])) for r in rows if r[key] > 0 ]
+    if len(points) < 2: return float('nan')
+
+    mx = sum(p[0] for p in points)/len(points)
+    my = sum(p[1] for p in points)/len(points)
+    return sum((x-mx)*(y-my) for x,y in points)/sum((x-mx)**2 for x,_ in points)
+
+def environment() -> Mapping[str,Any]:
+    try:
+        commit = subprocess.run(["git","rev-parse","HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = None
+
+    from vowpalwabbit import __version__ as vw_version
+
+    return {
+        'commit'   : commit,
+        'python'   : platform.python_version(),
+        'vw'       : vw_version,
+        'machine'  : platform.machine(),
+        'processor': platform.processor(),
+        'time'     : time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+def compare(old: Mapping[str,Any], new: Mapping[str,Any], tolerance: float) -> List[str]:
+    """Describe every latency in new that is more than tolerance times its value in old."""
+    identify = lambda r: (r['learner'], r['split'], r['bound'], r['n'])
+    previous = { identify(r): r for r in old['results'] }
+    failures = []
+
+    for row in new['results']:
+        before = previous.get(identify(row))
+        if before is None: continue
+
+        for key in ['predict_p50_us', 'predict_mean_us', 'learn_p50_us', 'learn_mean_us']:
+            if before[key] > 0 and row[key] > tolerance*before[key]:
+                failures.append(f"{identify(row)} {key} {before[key]:.1f} -> {row[key]:.1f}")
+
+    return failures
+
+def parse_args(argv: Sequence[str]) -> argparse.Namespace:
+    ints   = lambda s: [ int(float(v)) for v in s.split(",") ]
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--learners"   , default="emt,cmt,oaa", type=lambda s: s.split(","), help="any of emt, emt-numpy, cmt and oaa")
+    parser.add_argument("--checkpoints", default="1e3,1e4,1e5,1e6", type=ints, help="the n at which to close a window")
+    parser.add_argument("--splits"     , default="100", type=ints)
+    parser.add_argument("--bounds"     , default="0,10000", type=ints, help="0 is unbounded (EMT only)")
+    parser.add_argument("--dim"        , default=20, type=int)
+    parser.add_argument("--classes"    , default=10, type=int)
+    parser.add_argument("--out"        , default="results/scaling.json")
+    parser.add_argument("--compare"    , default=None, help="an earlier --out file to check for regressions")
+    parser.add_argument("--tolerance"  , default=1.25, type=float, help="the slowdown ratio that counts as a regression")
+    return parser.parse_args(argv)
+
+if __name__ == '__main__':
+
+    args    = parse_args(sys.argv[1:])
+    results = []
+    slopes  = []
+
+    print(f"{'learner':>10} {'split':>6} {'bound':>7} {'n':>8} {'acc':>6} {'ex/s':>8} {'pred p50':>9} {'pred p99':>9} {'lrn p50':>8} {'lrn p99':>8}")
+
+    for settings, learner in make_learners(args.learners, args.splits, args.bounds):
+        rows = []
+        for row in run(learner, sorted(args.checkpoints), args.dim, args.classes):
+            rows.append({**settings, 'dim': args.dim, 'classes': args.classes, **row})
+            r = rows[-1]
+            print(f"{r['learner']:>10} {r['split']:>6} {r['bound']:>7} {r['n']:>8} {r['accuracy']:>6.3f} {r['throughput_eps']:>8.0f} "
+                  f"{r['predict_p50_us']:>9.1f} {r['predict_p99_us']:>9.1f} {r['learn_p50_us']:>8.1f} {r['learn_p99_us']:>8.1f}")
+
+        results.extend(rows)
+        slopes.append({**settings, 'predict_slope': slope(rows,'predict_mean_us'), 'learn_slope': slope(rows,'learn_mean_us')})
+
+    print()
+    print(f"{'learner':>10} {'split':>6} {'bound':>7} {'pred slope':>11} {'lrn slope':>10}")
+    for s in slopes:
+        print(f"{s['learner']:>10} {s['split']:>6} {s['bound']:>7} {s['predict_slope']:>11.2f} {s['learn_slope']:>10.2f}")
+
+    output = {'environment': environment(), 'settings': vars(args), 'results': results, 'slopes': slopes}
+
+    with open(args.out, "w") as f: json.dump(output, f, indent=1)
+
+    if args.compare:
+        with open(args.compare) as f: failures = compare(json.load(f), output, args.tolerance)
+
+        print()
+        print(f"{len(failures)} regressions beyond {args.tolerance:g}x against {args.compare}")
+        for failure in failures: print("  " + failure)
+
+        if failures: sys.exit(1)
@@ -0,0 +1,99 @@
+"""Measure MicroBatchServer latency and throughput as the number of concurrent callers grows.
+
+Each simulated caller repeatedly requests a prediction, samples an action and sends its
+reward back as a learn. The `direct` row calls the learner synchronously from one caller
+as a baseline. Latency is measured from a caller's predict request to its response.
+
+Each served row is run with and without a batching deadline (`delay`, in ms). Every table is
+run for both EMT engines: the server answers a batch with one predict_many, which only shares
+memory work for the numpy engine since VW's emt reduction predicts one example per call.
+
+Run from the repository root with `python -m benchmarks.serving`.
+"""
+
+import time
+import asyncio
+
+from coba.random import CobaRandom
+
+from learners import EMT, EpisodicLearner
+from learners.profiling import LatencyHistogram
+from learners.serving import MicroBatchServer
+
+n_memories  = 2_000
+n_requests  = 2_000
+n_features  = 20
+n_actions   = 8
+concurrency = [1, 4, 16, 64]
+max_delays  = [0, 0.002]
+engines     = ["vw", "numpy"]
+
+def make_learner(rng: CobaRandom, engine: str) -> EpisodicLearner:
+    learner = EpisodicLearner(0.1, EMT(split=100, interactions=["xa"], engine=engine))
+
+    for _ in range(n_memories):
+        context = tuple(rng.randoms(n_features))
+        probs, info = learner.predict(context, list(range(n_actions)))
+        action = rng.choice(range(n_actions), probs)
+        learner.learn(context, action, reward(context, action), probs[action], **info)
+
+    return learner
+
+def reward(context, action) -> int:
+    return int(context[action] > .5)
+
+def request(rng: CobaRandom):
+    return tuple(rng.randoms(n_features)), list(range(n_actions))
+
+def run_direct(learner: EpisodicLearner, rng: CobaRandom) -> LatencyHistogram:
+    latency = LatencyHistogram()
+
+    for _ in range(n_requests):
+        context, actions = request(rng)
+        start            = time.perf_counter_ns()
+        probs, info      = learner.predict(context, actions)
+        latency.record(time.perf_counter_ns()-start)
+        action           = rng.choice(actions, probs)
+        learner.learn(context, action, reward(context, action), probs[action], **info)
+
+    return latency
+
+async def run_served(learner: EpisodicLearner, rng: CobaRandom, callers: int, max_delay: float):
+    latency = LatencyHistogram()
+
+    async def caller(server: MicroBatchServer, n: int) -> None:
+        for _ in range(n):
+            context, actions = request(rng)
+            start            = time.perf_counter_ns()
+            probs, info      = await server.predict(context, actions)
+            latency.record(time.perf_counter_ns()-start)
+            action           = rng.choice(actions, probs)
+            server.learn(context, action, reward(context, action), probs[action], **info)
+
+    async with MicroBatchServer(learner, max_delay=max_delay) as server:
+        await asyncio.gather(*[ caller(server, n_requests//callers) for _ in range(callers) ])
+        metrics = server.metrics
+
+    return latency, metrics
+
+if __name__ == '__main__':
+
+    for engine in engines:
+
+        rng     = CobaRandom(1)
+        learner = make_learner(rng, engine)
+
+        print(f"\n{engine}")
+        print(f"{'delay':>6} {'callers':>8} {'req/s':>8} {'p50 (ms)':>9} {'p99 (ms)':>9} {'batch':>6} {'max':>4}")
+
+        start   = time.perf_counter()
+        latency = run_direct(learner, rng)
+        seconds = time.perf_counter()-start
+        print(f"{'':>6} {'direct':>8} {latency.n/seconds:>8.0f} {latency.percentile(50)/1e6:>9.3f} {latency.percentile(99)/1e6:>9.3f} {1:>6.1f} {1:>4}")
+
+        for max_delay in max_delays:
+            for callers in concurrency:
+                start            = time.perf_counter()
+                latency, metrics = asyncio.run(run_served(learner, rng, callers, max_delay))
+                seconds          = time.perf_counter()-start
+                print(f"{1000*max_delay:>6g} {callers:>8} {latency.n/seconds:>8.0f} {latency.percentile(50)/1e6:>9.3f} {latency.percentile(99)/1e6:>9.3f} {metrics['batch_mean']:>6.1f} {metrics['batch_max']:>4}")
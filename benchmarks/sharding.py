@@ -0,0 +1,41 @@
+"""Compare ShardedEMT against a single EMT tree on the same synthetic stream.
+
+Every shard count is run with the `hash` and `kmeans` routers. Speedup is the single
+tree's time per example divided by the sharded time per example. Fan-out only pays off
+when there are at least as many free cores as shards and queries are expensive enough
+(i.e., the trees are large) to hide the cost of pickling each query to every shard.
+
+Run from the repository root with `python -m benchmarks.sharding`.
+"""
+
+import os
+import time
+
+from learners import EMT
+from learners.sharded import ShardedEMT
+from benchmarks.scaling import run
+
+n_examples = 20_000
+n_dim      = 20
+n_classes  = 10
+n_shards   = [2, 4, 8]
+
+def measure(learner) -> dict:
+    start = time.perf_counter()
+    row   = list(run(learner, [n_examples], n_dim, n_classes))[-1]
+    return {**row, 'seconds': time.perf_counter()-start}
+
+if __name__ == '__main__':
+
+    print(f"{os.cpu_count()} cores")
+    print(f"{'shards':>7} {'router':>7} {'acc':>6} {'ex/s':>8} {'pred p50':>9} {'lrn p50':>8} {'speedup':>8}")
+
+    single = measure(EMT(split=100))
+    print(f"{1:>7} {'-':>7} {single['accuracy']:>6.3f} {single['throughput_eps']:>8.0f} {single['predict_p50_us']:>9.1f} {single['learn_p50_us']:>8.1f} {1:>8.2f}")
+
+    for shards in n_shards:
+        for router in ["hash", "kmeans"]:
+            learner = ShardedEMT(shards, router, split=100)
+            row     = measure(learner)
+            learner.close()
+            print(f"{shards:>7} {router:>7} {row['accuracy']:>6.3f} {row['throughput_eps']:>8.0f} {row['predict_p50_us']:>9.1f} {row['learn_p50_us']:>8.1f} {single['seconds']/row['seconds']:>8.2f}")
@@ -0,0 +1,4 @@
+from experiments.environments import LocalSimulation, materialize, materialize_template, is_materialized, load_environments
+from experiments.results import ResultStore, export_result
+from experiments.sweep import successive_halving
+from experiments.lockstep import run_lockstep
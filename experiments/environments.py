@@ -0,0 +1,178 @@
+"""Materialize the OpenML environments of a template once and read them back offline.
+
+Run `python -m experiments.environments` (with network access) to write every task in
+./environments/feurer.json to ./datasets. Afterwards `load_environments` builds the
+same environments from those files without touching OpenML.
+
+The reservoir and scaling steps are also materialized (once per n_take and strict) and
+shuffles are applied as index permutations over memory-mapped arrays. Every experiment
+worker therefore shares one copy of each dataset through the OS page cache.
+"""
+
+import json
+import shutil
+
+from pathlib import Path
+from typing import Any, Iterable, Mapping, Optional, Tuple
+
+import numpy as np
+
+import coba as cb
+from coba.random import CobaRandom
+from coba.environments import Environment, Reservoir, Scale
+from coba.primitives.rewards import MulticlassReward
+
+class LocalSimulation(Environment):
+    """A classification environment read from the files written by materialize.
+
+    Dense contexts are stored as a float64 matrix where categorical columns hold level
+    codes and sparse contexts are stored as CSR arrays. Labels are stored as codes into
+    the action list. All arrays are memory-mapped so reading starts immediately.
+
+    When `shuffle` is given rows are read in the order coba's Shuffle(shuffle) would
+    put them in without copying the arrays.
+
+    Params are those of the materialized environment after it was read, so unlike a coba
+    simulation they include `n_actions` before this environment has been read.
+    """
+
+    def __init__(self, path: str, shuffle: Optional[int] = None) -> None:
+        self._path    = Path(path)
+        self._meta    = json.loads((self._path/"meta.json").read_text())
+        self._shuffle = shuffle
+
+    @property
+    def params(self) -> Mapping[str,Any]:
+        return self._meta['params'] if self._shuffle is None else {**self._meta['params'], 'shuffle': self._shuffle}
+
+    @property
+    def shape(self) -> Tuple[int,int]:
+        """The number of interactions and actions (known without reading any interactions)."""
+        return len(self._load("y")), len(self._meta['actions'])
+
+    def read(self) -> Iterable[Mapping[str,Any]]:
+        actions = self._meta['actions']
+        rewards = [ MulticlassReward(a) for a in actions ]
+        labels  = self._load("y")
+        order   = range(len(labels))
+
+        #a permutation of row indexes is the same permutation coba applies to the rows
+        if self._shuffle is not None: order = CobaRandom(self._shuffle).shuffle(list(order), inplace=True)
+
+        if 'keys' in self._meta:
+            keys    = self._meta['keys']
+            indptr  = self._load("indptr")
+            indices = self._load("indices")
+            values  = self._load("values")
+
+            for i in order:
+                lo, hi  = indptr[i], indptr[i+1]
+                context = dict(zip(map(keys.__getitem__,indices[lo:hi].tolist()), values[lo:hi].tolist()))
+                yield {'context': context, 'actions': actions, 'rewards': rewards[labels[i]]}
+
+        else:
+            X      = self._load("X")
+            levels = [ (i,l) for i,l in enumerate(self._meta['levels']) if l ]
+
+            for r in order:
+                context = X[r].tolist()
+                for i, l in levels: context[i] = l[int(context[i])]
+                yield {'context': context, 'actions': actions, 'rewards': rewards[labels[r]]}
+
+    def _load(self, name: str) -> np.ndarray:
+        return np.load(self._path/f"{name}.npy", mmap_mode='r')
+
+def materialize(env: Environment, path: str) -> None:
+    """Write a classification environment's interactions to path in LocalSimulation's format."""
+
+    path    = Path(path)
+    tmp     = path.with_name(path.name + ".tmp")
+    arrays  = {}
+    actions = None
+    labels  = []
+    rows    = []
+    codes   : list = []
+
+    for interaction in env.read():
+        if actions is None:
+            actions = list(interaction['actions'])
+            action_codes = { a:i for i,a in enumerate(actions) }
+
+        labels.append(action_codes[max(actions, key=interaction['rewards'].eval)])
+        rows.append(interaction['context'])
+
+    if actions is None: raise ValueError(f"{env} has no interactions.")
+
+    meta = {'params': dict(env.params), 'actions': [ str(a) for a in actions ]}
+
+    if rows and isinstance(rows[0], dict):
+        #sparse string values are stored the same way VW sees them (i.e., key=value:1)
+        keys = {}
+        items = [ [ (f"{k}={v}",1.) if isinstance(v,str) else (k,float(v)) for k,v in row.items() ] for row in rows ]
+        arrays['indptr']  = np.cumsum([0]+[len(i) for i in items], dtype=np.int64)
+        arrays['indices'] = np.array([ keys.setdefault(k,len(keys)) for i in items for k,_ in i ], dtype=np.int32)
+        arrays['values']  = np.array([ v for i in items for _,v in i ], dtype=np.float64)
+        meta['keys']      = list(keys)
+    else:
+        codes = [ {} for _ in rows[0] ]
+        arrays['X'] = np.array([ [ codes[i].setdefault(v,len(codes[i])) if isinstance(v,str) else v for i,v in enumerate(row) ] for row in rows ], dtype=np.float64)
+        meta['levels'] = [ list(c) or None for c in codes ]
+
+    arrays['y'] = np.array(labels, dtype=np.int32)
+
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+
+    for name, array in arrays.items(): np.save(tmp/f"{name}.npy", array)
+    (tmp/"meta.json").write_text(json.dumps(meta))
+
+    shutil.rmtree(path, ignore_errors=True)
+    tmp.rename(path)
+
+def template_variables(template: str) -> Mapping[str,Any]:
+    return json.loads(Path(template).read_text())['variables']
+
+def materialize_template(template: str = "./environments/feurer.json", path: str = "./datasets", overwrite: bool = False) -> None:
+    """Materialize every OpenML task in a template (tasks already written are skipped)."""
+
+    for task_id in template_variables(template)['$task_ids']:
+        if (Path(path)/str(task_id)/"meta.json").exists() and not overwrite: continue
+        print(f"Materializing OpenML task {task_id}")
+        materialize(cb.Environments.from_openml(task_id=task_id).repr('string','string')[0], Path(path)/str(task_id))
+
+def is_materialized(template: str = "./environments/feurer.json", path: str = "./datasets") -> bool:
+    return all((Path(path)/str(t)/"meta.json").exists() for t in template_variables(template)['$task_ids'])
+
+def prepare(task: str, n_take: Optional[int], strict: bool) -> Optional[Path]:
+    """Materialize a task after its reservoir and scaling steps (None if strict and too small)."""
+    prepared = Path(task)/f"take_{n_take}{'_strict' if strict else ''}"
+
+    if not (prepared/"meta.json").exists() and not (prepared/"empty").exists():
+        env = cb.Environments([LocalSimulation(task)]).filter(Reservoir(n_take, strict)).filter(Scale(0,'minmax'))[0]
+        try:
+            materialize(env, prepared)
+        except ValueError:
+            prepared.mkdir(parents=True, exist_ok=True)
+            (prepared/"empty").touch()
+
+    return prepared if (prepared/"meta.json").exists() else None
+
+def load_environments(template: str = "./environments/feurer.json", path: str = "./datasets", **user_vars) -> cb.Environments:
+    """Create a template's environments from materialized files or from OpenML if they aren't all materialized.
+
+    Args:
+        template: A template with the same shape as feurer.json (openml, reservoir, repr, scale, shuffle).
+        path: The directory that materialize_template wrote to.
+        **user_vars: Overrides for the template's variables (i.e., n_take, strict and n_shuffle).
+    """
+
+    if not is_materialized(template, path):
+        return cb.Environments.from_template(template, **user_vars)
+
+    variables = { **template_variables(template), **{ f"${k}":v for k,v in user_vars.items() } }
+    prepared  = [ prepare(Path(path)/str(t), variables['$n_take'], variables['$strict']) for t in variables['$task_ids'] ]
+
+    return cb.Environments([ LocalSimulation(p, seed) for p in prepared if p for seed in range(variables['$n_shuffle']) ])
+
+if __name__ == '__main__':
+    materialize_template()
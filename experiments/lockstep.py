@@ -0,0 +1,183 @@
+"""Evaluate several learners on one read of each environment instead of one read per learner.
+
+coba evaluates every (environment, learner) pair as its own task so an environment's
+interactions are read, shuffled and finalized once for each learner. Here each task is an
+environment and a group of learners. The interactions are read once and handed to each
+learner's own evaluator in lockstep, so each learner keeps its own seeded exploration and
+its own logged rows. The log uses coba's transaction format and loads with Result.from_file.
+
+Tasks are dispatched longest first by their estimated cost (see experiments.schedule), and idle
+workers pull the next longest task. Each task's timing is appended to a history that sharpens
+the estimates of later runs, and how busy every worker was is logged at the end.
+"""
+
+import os
+import time
+import multiprocessing as mp
+from copy import deepcopy
+from itertools import tee, islice
+from pathlib import Path
+from time import perf_counter
+from typing import Any, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+from coba.context import CobaContext, ExceptLog
+from coba.environments import Environment, SafeEnvironment, Finalize, BatchSafe
+from coba.evaluators import OnPolicyEvaluator, SafeEvaluator
+from coba.learners import SafeLearner
+from coba.pipes import Pipes, DiskSink, DiskSource
+from coba.experiments.results import TransactionEncode, TransactionDecode
+from coba.utilities import peek_first
+
+from experiments.schedule import CostModel, append_history, history_path, utilization
+
+class StreamEnvironment:
+    """An environment whose read returns an already open stream of interactions."""
+
+    def __init__(self, env: Environment, interactions: Iterable[Mapping[str,Any]]) -> None:
+        self._env          = env
+        self._interactions = interactions
+
+    @property
+    def params(self) -> Mapping[str,Any]:
+        return SafeEnvironment(self._env).params
+
+    def read(self) -> Iterable[Mapping[str,Any]]:
+        return self._interactions
+
+def evaluate_lockstep(env: Environment, learners: Sequence[Any], evaluator: Any, seconds: Optional[List[float]] = None) -> Sequence[Optional[list]]:
+    """Evaluate every learner on a single read of env (None for learners that raised).
+
+    If seconds is given, the time spent advancing each learner's evaluator is added to it.
+    """
+    interactions = peek_first(env.read())[1]
+
+    if not interactions: return [ [] for _ in learners ]
+
+    streams    = tee(BatchSafe(Finalize()).filter(interactions), len(learners))
+    evaluators = [ iter(SafeEvaluator(evaluator).evaluate(StreamEnvironment(env,s), l)) for s,l in zip(streams,learners) ]
+
+    #only the evaluators hold the streams so a dropped learner's stream stops buffering interactions
+    del streams
+    records    = [ [] for _ in learners ]
+    running    = list(range(len(learners)))
+    seconds    = seconds if seconds is not None else [0.]*len(learners)
+
+    #advancing every evaluator by one row at a time keeps tee's buffer to a few interactions
+    while running:
+        for i in list(running):
+            start = perf_counter()
+            try:
+                records[i].append(next(evaluators[i]))
+            except StopIteration:
+                running.remove(i)
+            except Exception as e:
+                #coba's loggers take strings so the exception is formatted the way cb.Experiment formats it
+                CobaContext.logger.log(ExceptLog().filter(e))
+                records[i]    = None
+                evaluators[i] = None
+                running.remove(i)
+            seconds[i] += perf_counter()-start
+
+    return records
+
+def _run_task(task: Tuple[int,Environment,Sequence[Tuple[int,Any]],Any,int]) -> Tuple[Sequence[list],Mapping[str,Any]]:
+    env_id, env, learners, evaluator, seed = task
+
+    CobaContext.store['experiment_seed'] = seed
+
+    seconds = [0.]*len(learners)
+    start   = time.time()
+
+    with CobaContext.logger.time(f"Evaluating Learners {[l for l,_ in learners]} on Environment {env_id}..."):
+        try:
+            records = evaluate_lockstep(env, [ deepcopy(l) for _,l in learners ], evaluator, seconds)
+        except Exception as e:
+            #an environment that can't be read loses its task but, as in cb.Experiment, not the run
+            CobaContext.logger.log(ExceptLog().filter(e))
+            records = [None]*len(learners)
+
+    #learners that raised are left out of the timings so they don't skew later estimates
+    timing = {
+        'environment_id' : env_id,
+        'learner_ids'    : [ l for (l,_),r in zip(learners,records) if r ],
+        'learner_seconds': [ t for t,r in zip(seconds,records) if r ],
+        'worker'         : os.getpid(),
+        'start'          : start,
+        'stop'           : time.time(),
+    }
+
+    return [ ["T4", (env_id, lrn_id, 0), rows] for (lrn_id,_), rows in zip(learners,records) if rows ], timing
+
+def run_lockstep(environments: Sequence[Environment], learners: Sequence[Any], log: str, evaluator: Optional[Any] = None,
+    processes: int = 1, group: Optional[int] = None, seed: int = 1, description: Optional[str] = None, history: Optional[str] = None) -> Mapping[str,Any]:
+    """Evaluate learners on environments with one read of each environment per group of learners.
+
+    Args:
+        environments: The environments to evaluate on.
+        learners: The learners to evaluate. Each task gets its own copy.
+        log: The coba transaction log to write. An existing log is resumed.
+        evaluator: The coba evaluator to use for every learner (OnPolicyEvaluator when None).
+        processes: The number of worker processes.
+        group: The number of learners that share one read of an environment (all when None). With
+            a group of 1 every (environment, learner) pair is its own task as in cb.Experiment.
+        seed: The seed coba uses for each learner's exploration.
+        description: The description of the experiment.
+        history: The task timing history used to estimate costs and appended to (next to the log when None).
+
+    Returns:
+        The utilization report of the run's workers (see experiments.schedule.utilization).
+    """
+    evaluator = evaluator or OnPolicyEvaluator()
+    group     = group or len(learners)
+    history   = history or history_path(log)
+    costs     = CostModel.from_file(history)
+    timings   = []
+    done      = set()
+
+    if Path(log).exists():
+        for trx in Pipes.join(DiskSource(log), TransactionDecode()).read():
+            if trx and trx[0] == "I": done.add(tuple(trx[1][:2]))
+
+    tasks = []
+    for env_id, env in enumerate(environments):
+        todo = [ (lrn_id,lrn) for lrn_id,lrn in enumerate(learners) if (env_id,lrn_id) not in done ]
+        tasks.extend( (env_id, env, todo[i:i+group], evaluator, seed) for i in range(0, len(todo), group) )
+
+    #longest first so the tasks started last are the shortest ones
+    tasks.sort(key=lambda task: sum(costs.estimate(task[1],lrn) for _,lrn in task[2]), reverse=True)
+
+    def collect(results: Iterable[Tuple[Sequence[list],Mapping[str,Any]]]) -> Iterable[list]:
+        for rows, timing in results:
+            timings.append(timing)
+            yield from rows
+
+    def transactions() -> Iterable[Any]:
+        yield ["T0", {'n_learners': len(learners), 'n_environments': len(environments), 'description': description, 'seed': seed}]
+        for env_id, env in enumerate(environments): yield ["T1", env_id, SafeEnvironment(env).params]
+        for lrn_id, lrn in enumerate(learners)    : yield ["T2", lrn_id, SafeLearner(lrn).params]
+        yield ["T3", 0, SafeEvaluator(evaluator).params]
+
+        if processes == 1:
+            yield from collect(map(_run_task, tasks))
+        else:
+            #one task at a time so an idle worker always takes the longest task left
+            with mp.Pool(processes) as pool:
+                yield from collect(pool.imap_unordered(_run_task, tasks, chunksize=1))
+
+    lines = TransactionEncode().filter(transactions())
+
+    #a resumed log already starts with a version line (repeated parameter rows are merged when read)
+    if done: lines = islice(lines, 1, None)
+
+    Pipes.join(DiskSink(log, 'a' if done else 'w')).write(lines)
+
+    append_history(history, environments, learners, timings)
+
+    report = utilization(timings, processes)
+
+    for worker, stats in sorted(report['workers'].items()):
+        CobaContext.logger.log(f"Worker {worker} ran {stats['tasks']} tasks and was busy {stats['busy']:.1f}s ({stats['utilization']:.0%})")
+
+    CobaContext.logger.log(f"Makespan {report['makespan']:.1f}s (lower bound {report['lower_bound']:.1f}s)")
+
+    return report
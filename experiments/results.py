@@ -0,0 +1,228 @@
+"""Export coba transaction logs to a columnar store that notebooks can memory-map.
+
+Run `python -m experiments.results ./results/unbounded.log.gz` to export a log (or to append
+what's new in it) to ./results/unbounded.columns. Each learner gets its own directory of
+segments and each segment holds one .npy file per numeric interaction column and a spans
+file giving the rows of every environment. Per-environment aggregates are kept alongside so
+a table or contrast plot doesn't have to read any interactions at all.
+"""
+
+import sys
+import json
+import shutil
+
+from pathlib import Path
+from collections import defaultdict
+from typing import Any, Iterable, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+import coba as cb
+from coba.pipes import Pipes, DiskSource
+from coba.experiments.results import Table, TransactionDecode
+
+Block = Tuple[int,int,int,Mapping[str,np.ndarray]]
+
+def numeric_columns(packed: Mapping[str,Sequence[Any]]) -> Mapping[str,np.ndarray]:
+    """The columns of a packed interaction block whose values are all numbers or None."""
+    columns = {}
+    for name, values in packed.items():
+        if all(v is None or (isinstance(v,(int,float)) and not isinstance(v,bool)) for v in values) and any(v is not None for v in values):
+            columns[name] = np.array([ np.nan if v is None else v for v in values ], dtype=np.float64)
+    return columns
+
+class ResultStore:
+    """A columnar, append-only copy of one or more coba transaction logs."""
+
+    def __init__(self, path: str) -> None:
+        self._path = Path(path)
+
+        if (self._path/"meta.json").exists():
+            self._meta = json.loads((self._path/"meta.json").read_text())
+        else:
+            self._meta = {'experiment': {}, 'environments': {}, 'learners': {}, 'evaluators': {}, 'columns': [], 'exported': [], 'segments': {}, 'logs': {}}
+
+    @property
+    def columns(self) -> Sequence[str]:
+        """The numeric interaction columns that have been exported."""
+        return list(self._meta['columns'])
+
+    @property
+    def environments(self) -> Mapping[int,Mapping[str,Any]]:
+        return { int(k): v for k,v in self._meta['environments'].items() }
+
+    @property
+    def learners(self) -> Mapping[int,Mapping[str,Any]]:
+        return { int(k): v for k,v in self._meta['learners'].items() }
+
+    @property
+    def aggregates(self) -> Mapping[str,np.ndarray]:
+        """One row per (environment, learner, evaluator) with its interaction count and column means."""
+        return { p.stem: np.load(p, mmap_mode='r') for p in sorted((self._path/"aggregates").glob("*.npy")) }
+
+    def append(self, log: str, flush_rows: int = 2_000_000) -> int:
+        """Export the interactions in log that aren't in the store yet and return how many blocks were added.
+
+        A log whose size and modification time match its last append is skipped without being read.
+
+        Args:
+            log: A coba transaction log (e.g., ./results/unbounded.log.gz).
+            flush_rows: The number of a learner's rows to buffer before writing them as a segment.
+        """
+        #a log that hasn't changed since it was last appended has nothing new
+        stat = Path(log).stat()
+        seen = [stat.st_size, stat.st_mtime_ns]
+        if self._meta.setdefault('logs',{}).get(str(Path(log).resolve())) == seen: return 0
+
+        exported = set(map(tuple,self._meta['exported']))
+        tables   = {'E': 'environments', 'L': 'learners', 'V': 'evaluators'}
+        buffers  : Mapping[int,list] = defaultdict(list)
+        rows     : Mapping[int,int]  = defaultdict(int)
+        added    = []
+
+        #the log is streamed so only the buffered rows are ever held in memory
+        for trx in Pipes.join(DiskSource(log), TransactionDecode()).read():
+
+            if not trx: continue
+
+            if trx[0] == "experiment":
+                self._meta['experiment'].update(trx[1])
+
+            if trx[0] in tables:
+                self._meta[tables[trx[0]]].setdefault(str(trx[1]),{}).update(trx[2])
+
+            if trx[0] == "I":
+                env_id, lrn_id, val_id = trx[1] if len(trx[1]) == 3 else [*trx[1],0]
+                columns = numeric_columns(trx[2].get('_packed') or {})
+
+                if (env_id, lrn_id, val_id) in exported or not columns: continue
+
+                exported.add((env_id, lrn_id, val_id))
+                buffers[lrn_id].append((env_id, lrn_id, val_id, columns))
+                rows[lrn_id] += len(next(iter(columns.values())))
+
+                if rows[lrn_id] >= flush_rows:
+                    added += self._write_segment(lrn_id, buffers.pop(lrn_id))
+                    rows[lrn_id] = 0
+
+        for lrn_id, blocks in buffers.items():
+            added += self._write_segment(lrn_id, blocks)
+
+        self._write_aggregates(added)
+        self._meta['exported'] = sorted(exported)
+        self._meta['logs'][str(Path(log).resolve())] = seen
+        self._write_json("meta.json", self._meta)
+
+        return len(added)
+
+    def interactions(self, columns: Sequence[str] = ('reward',), learners: Optional[Sequence[int]] = None, environments: Optional[Sequence[int]] = None) -> Mapping[str,np.ndarray]:
+        """Read the given columns (plus the ids and index) for the selected learners and environments."""
+        ids    = {'environment_id': [], 'learner_id': [], 'evaluator_id': [], 'index': []}
+        values = { c: [] for c in columns }
+
+        for lrn_id, segment in self._segments(learners):
+            spans  = np.load(segment/"spans.npy")
+            arrays = { c: np.load(segment/f"{c}.npy", mmap_mode='r') if (segment/f"{c}.npy").exists() else None for c in columns }
+
+            for env_id, val_id, start, stop in spans.tolist():
+                if environments is not None and env_id not in environments: continue
+
+                ids['environment_id'].append(np.full(stop-start, env_id))
+                ids['learner_id'    ].append(np.full(stop-start, lrn_id))
+                ids['evaluator_id'  ].append(np.full(stop-start, val_id))
+                ids['index'         ].append(np.arange(1, stop-start+1))
+
+                for c, array in arrays.items():
+                    values[c].append(array[start:stop] if array is not None else np.full(stop-start, np.nan))
+
+        return { k: np.concatenate(v) if v else np.array([]) for k,v in {**ids, **values}.items() }
+
+    def result(self, columns: Sequence[str] = ('reward',), learners: Optional[Sequence[int]] = None, environments: Optional[Sequence[int]] = None) -> cb.Result:
+        """A coba Result holding only the given columns so the usual plotting methods can be used."""
+        interactions = self.interactions(columns, learners, environments)
+
+        env_table = Table(columns=['environment_id']).insert([ {'environment_id': int(k), **v} for k,v in self._meta['environments'].items() ])
+        lrn_table = Table(columns=['learner_id'    ]).insert([ {'learner_id'    : int(k), **v} for k,v in self._meta['learners'    ].items() ])
+        val_table = Table(columns=['evaluator_id'  ]).insert([ {'evaluator_id'  : int(k), **v} for k,v in self._meta['evaluators'  ].items() ])
+        int_table = Table(columns=list(interactions)).insert({ k: v.tolist() for k,v in interactions.items() })
+
+        return cb.Result(env_table, lrn_table, val_table, int_table, self._meta['experiment'])
+
+    def _segments(self, learners: Optional[Sequence[int]]) -> Iterable[Tuple[int,Path]]:
+        for lrn_id, count in sorted((int(k),v) for k,v in self._meta['segments'].items()):
+            if learners is not None and lrn_id not in learners: continue
+            for i in range(count):
+                yield lrn_id, self._path/"interactions"/f"learner_{lrn_id}"/f"segment_{i}"
+
+    def _write_segment(self, lrn_id: int, blocks: Sequence[Block]) -> Sequence[Block]:
+        i       = self._meta['segments'].get(str(lrn_id), 0)
+        segment = self._path/"interactions"/f"learner_{lrn_id}"/f"segment_{i}"
+        names   = sorted(set().union(*[b[3] for b in blocks]))
+        lengths = [ len(next(iter(b[3].values()))) for b in blocks ]
+        stops   = np.cumsum(lengths)
+
+        shutil.rmtree(segment, ignore_errors=True)
+        segment.mkdir(parents=True)
+
+        for name in names:
+            np.save(segment/f"{name}.npy", np.concatenate([ b[3].get(name, np.full(n,np.nan)) for b,n in zip(blocks,lengths) ]))
+
+        np.save(segment/"spans.npy", np.array([ (b[0], b[2], stop-n, stop) for b,n,stop in zip(blocks,lengths,stops) ], dtype=np.int64))
+
+        self._meta['segments'][str(lrn_id)] = i+1
+        self._meta['columns'] = sorted(set(self._meta['columns']) | set(names))
+
+        return blocks
+
+    def _write_aggregates(self, blocks: Sequence[Block]) -> None:
+        if not blocks: return
+
+        old  = { k: np.asarray(v) for k,v in self.aggregates.items() }
+        n    = len(next(iter(old.values()))) if old else 0
+        new  = defaultdict(list)
+
+        for env_id, lrn_id, val_id, columns in blocks:
+            new['environment_id'].append(env_id)
+            new['learner_id'    ].append(lrn_id)
+            new['evaluator_id'  ].append(val_id)
+            new['n'             ].append(len(next(iter(columns.values()))))
+
+            for name in self._meta['columns']:
+                values = columns.get(name)
+                finite = values[~np.isnan(values)] if values is not None else values
+                new[f"{name}_mean"].append(finite.mean() if finite is not None and len(finite) else np.nan)
+
+        (self._path/"aggregates").mkdir(parents=True, exist_ok=True)
+
+        for name in new.keys() | old.keys():
+            dtype  = np.int64 if name in ['environment_id','learner_id','evaluator_id','n'] else np.float64
+            before = old.get(name, np.full(n, np.nan))
+            after  = new.get(name, [np.nan]*len(blocks))
+            np.save(self._path/"aggregates"/f"{name}.npy", np.concatenate([before, after]).astype(dtype))
+
+    def _write_json(self, name: str, value: Any) -> None:
+        tmp = self._path/f"{name}.tmp"
+        tmp.write_text(json.dumps(value))
+        tmp.replace(self._path/name)
+
+def export_result(log: str, path: Optional[str] = None, append: bool = True) -> ResultStore:
+    """Export a coba transaction log to a ResultStore (by default next to the log as *.columns).
+
+    Args:
+        log: A coba transaction log.
+        path: Where to write the store. Defaults to the log's path with .columns in place of .log.gz.
+        append: Add only what's new to an existing store rather than exporting from scratch.
+    """
+    path = Path(path or str(log).replace(".log.gz","").replace(".log","") + ".columns")
+
+    if not append: shutil.rmtree(path, ignore_errors=True)
+    path.mkdir(parents=True, exist_ok=True)
+
+    store = ResultStore(path)
+    store.append(log)
+    return store
+
+if __name__ == '__main__':
+    for log in sys.argv[1:]:
+        print(f"Exporting {log}")
+        export_result(log)
@@ -0,0 +1,109 @@
+"""Estimate what each experiment task costs so the most expensive tasks can be started first.
+
+The tasks of a template vary in size by orders of magnitude and a few large tasks started
+late stretch a run's tail. A task's cost is estimated from its environment's row count
+(capped by n_take), its action count and past task timings. Timings are appended to a
+history file after every run so each run is scheduled with what the previous runs measured.
+"""
+
+import json
+
+from math import log2
+from pathlib import Path
+from statistics import median, mean
+from collections import defaultdict
+from typing import Any, Iterable, Mapping, Sequence, Tuple
+
+from coba.environments import SafeEnvironment
+from coba.learners import SafeLearner
+
+def history_path(log: str) -> str:
+    """The task timing history of a log (e.g., ./results/unbounded.tasks.jsonl)."""
+    return str(log).replace(".log.gz","").replace(".log","") + ".tasks.jsonl"
+
+def environment_key(env: Any) -> str:
+    #shuffles of a dataset cost the same so they share a key
+    return json.dumps({ k:v for k,v in SafeEnvironment(env).params.items() if k != 'shuffle' }, sort_keys=True, default=str)
+
+def learner_key(lrn: Any) -> str:
+    return json.dumps(SafeLearner(lrn).params, sort_keys=True, default=str)
+
+def environment_shape(env: Any) -> Tuple[int,int]:
+    """An environment's interaction and action counts without reading it (1 where it can't be known)."""
+    if hasattr(env, 'shape'): return env.shape
+    return SafeEnvironment(env).params.get('reservoir_count') or 1, 1
+
+def work(rows: int, actions: int) -> float:
+    """The relative work of a task before any timings are known.
+
+    Memory learners query a tree that deepens as it grows and every learner scores
+    each action, so work grows as rows*log(rows) and linearly in actions.
+    """
+    return rows * log2(rows+1) * actions
+
+class CostModel:
+    """Estimate the seconds a learner needs on an environment from past task timings.
+
+    A pair that has been timed before is estimated by its mean time. Otherwise, the work of the
+    task is scaled by the learner's median seconds per unit of work (or the median over all
+    learners for a learner that has never been timed).
+    """
+
+    def __init__(self, history: Iterable[Mapping[str,Any]] = ()) -> None:
+        rates = defaultdict(list)
+        times = defaultdict(list)
+
+        for task in history:
+            rates[task['learner']].append(task['seconds']/max(work(task['rows'], task['actions']),1))
+            times[(task['environment'], task['learner'])].append(task['seconds'])
+
+        self._rates   = { k: median(v) for k,v in rates.items() }
+        self._times   = { k: mean(v) for k,v in times.items() }
+        self._default = median(self._rates.values()) if self._rates else 1
+
+    @classmethod
+    def from_file(cls, path: str) -> 'CostModel':
+        path = Path(path)
+        return cls(map(json.loads, path.read_text().splitlines()) if path.exists() else [])
+
+    def estimate(self, env: Any, lrn: Any) -> float:
+        timed = self._times.get((environment_key(env), learner_key(lrn)))
+        if timed is not None: return timed
+        return self._rates.get(learner_key(lrn), self._default) * work(*environment_shape(env))
+
+def append_history(path: str, environments: Sequence[Any], learners: Sequence[Any], timings: Iterable[Mapping[str,Any]]) -> None:
+    """Append each learner's seconds on each environment to a history file."""
+    with open(path, "a") as f:
+        for timing in timings:
+            env = environments[timing['environment_id']]
+            rows, actions = environment_shape(env)
+            for lrn_id, seconds in zip(timing['learner_ids'], timing['learner_seconds']):
+                task = {'environment': environment_key(env), 'learner': learner_key(learners[lrn_id]), 'rows': rows, 'actions': actions, 'seconds': seconds}
+                f.write(json.dumps(task)+"\n")
+
+def utilization(timings: Sequence[Mapping[str,Any]], processes: int) -> Mapping[str,Any]:
+    """Summarize how busy each worker was from the start and stop time of every task.
+
+    The makespan is compared to its lower bound (the larger of the longest task and the
+    total work spread evenly over every process) to show how much of the tail is avoidable.
+    """
+    if not timings: return {'makespan': 0, 'lower_bound': 0, 'busy': 0, 'workers': {}}
+
+    start    = min(t['start'] for t in timings)
+    makespan = max(t['stop'] for t in timings) - start
+    workers  = defaultdict(lambda: {'tasks': 0, 'busy': 0.})
+
+    for t in timings:
+        workers[t['worker']]['tasks'] += 1
+        workers[t['worker']]['busy' ] += t['stop']-t['start']
+
+    busy = sum(w['busy'] for w in workers.values())
+
+    for w in workers.values(): w['utilization'] = w['busy']/makespan if makespan else 1.
+
+    return {
+        'makespan'   : makespan,
+        'lower_bound': max(max(t['stop']-t['start'] for t in timings), busy/processes),
+        'busy'       : busy,
+        'workers'    : dict(workers),
+    }
@@ -0,0 +1,72 @@
+"""Sweep learner configurations with successive halving instead of running every one to completion."""
+
+from math import ceil
+from pathlib import Path
+from typing import Any, Optional, Sequence
+
+import coba as cb
+from coba.context import CobaContext
+
+from experiments.results import export_result
+
+def round_log(log: str, i: int) -> str:
+    """The log of the i-th elimination round (e.g., ./results/capacity.round1.log.gz)."""
+    path = Path(log)
+    stem = path.name.replace(".log.gz","").replace(".log","")
+    return str(path.with_name(f"{stem}.round{i}.log.gz"))
+
+def progressive_reward(log: str, n_learners: int) -> Sequence[float]:
+    """Each learner's final progressive reward averaged over the environments of a log."""
+    aggregates = export_result(log).aggregates
+
+    totals = [0.]*n_learners
+    counts = [0 ]*n_learners
+
+    for lrn_id, reward in zip(aggregates['learner_id'].tolist(), aggregates['reward_mean'].tolist()):
+        totals[lrn_id] += reward
+        counts[lrn_id] += 1
+
+    return [ t/c if c else float('-inf') for t,c in zip(totals,counts) ]
+
+def successive_halving(environments: cb.Environments, learners: Sequence[Any], log: str, rounds: Sequence[int] = (500, 1_000), keep: float = 0.5,
+    evaluator: Optional[Any] = None, processes: int = 1, description: Optional[str] = None) -> Sequence[int]:
+    """Run learners over growing prefixes of every environment and drop the worst after each prefix.
+
+    Every round is its own coba experiment so the slots of dropped learners go straight
+    to the survivors. The survivors of the last round are run on the full environments and
+    logged to `log` so their full curves can be plotted as usual. Eliminated learners keep
+    their curves up to the prefix where they were dropped in each round's own log.
+
+    Args:
+        environments: The environments to sweep over.
+        learners: The learner configurations to compare.
+        log: Where to log the final round (elimination rounds are logged beside it).
+        rounds: The number of interactions to take from each environment in each elimination round.
+        keep: The fraction of learners (rounded up) that survive each elimination round.
+        evaluator: The coba evaluator to use (OnPolicyEvaluator when None).
+        processes: The number of processes coba uses for each round.
+        description: The description of the experiment.
+
+    Returns:
+        The indexes of the learners that ran on the full environments.
+    """
+    survivors = list(range(len(learners)))
+    evaluator = evaluator or cb.OnPolicyEvaluator()
+
+    def run(envs: cb.Environments, path: str) -> None:
+        cb.Experiment(envs, [ learners[i] for i in survivors ], evaluator, description=description).run(path, processes=processes)
+
+    for i, n in enumerate(rounds, 1):
+        if len(survivors) == 1: break
+
+        run(environments.take(n), round_log(log, i))
+
+        rewards   = progressive_reward(round_log(log, i), len(survivors))
+        ranked    = sorted(range(len(survivors)), key=rewards.__getitem__, reverse=True)
+        survivors = sorted(survivors[r] for r in ranked[:ceil(keep*len(survivors))])
+
+        CobaContext.logger.log(f"Successive halving round {i} ({n} interactions) kept learners {survivors}")
+
+    run(environments, log)
+
+    return survivors
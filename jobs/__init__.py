@@ -0,0 +1,2 @@
+from jobs.scheduler import Job, Scheduler, vw_summary, vw_memory
+from jobs.caches import VWCache
@@ -0,0 +1,107 @@
+"""Parse each VW data file once into a binary cache that every model on it can read.
+
+VW writes labels to a cache with the label parser of the reductions it runs and refuses a
+cache written with a different bit precision (replacing it with a new, empty one when no
+text input is given). A shared cache is therefore keyed by its data file, its label type and
+the flags that change how features are parsed. A manifest beside each cache records what it
+was built from so a cache whose data file, flags or VW version has changed is rebuilt.
+
+Run `python -m jobs.caches ./data/aloi_train.vw "--oaa 1000 -b 29"` to build the cache of a data file for a model's
+arguments directly (this is what a cache job runs).
+"""
+
+import sys
+import json
+import shlex
+import hashlib
+import subprocess
+
+from pathlib import Path
+from functools import lru_cache
+from typing import Any, Mapping, Optional, Sequence
+
+from jobs.scheduler import Job
+
+#reductions whose examples are parsed (and cached) with multiclass labels
+MULTICLASS = ['--oaa', '--log_multi', '--recall_tree', '--emt', '--memory_tree']
+
+#flags that change the features written to a cache (mapped to their canonical names)
+PARSE_FLAGS = {'-b': '-b', '--bit_precision': '-b', '--hash': '--hash', '--ignore': '--ignore', '--ignore_linear': '--ignore_linear',
+    '--keep': '--keep', '--affix': '--affix', '--spelling': '--spelling', '--ngram': '--ngram', '--skips': '--skips'}
+
+def label_args(args: Sequence[str]) -> str:
+    """The cheapest VW arguments that parse labels the way a model with the given arguments does."""
+    if '--multilabel' in args or not any(a in MULTICLASS for a in args):
+        raise ValueError(f"Shared caches are only supported for multiclass reductions ({' '.join(MULTICLASS)}).")
+    #a single class oaa keeps multiclass labels without paying for a pass over every class
+    return "--oaa 1 --noop"
+
+def parse_args(args: Sequence[str]) -> str:
+    """The flags (and their values) in the given arguments that change how VW parses features."""
+    flags = [ f"{PARSE_FLAGS[a]} {v}" for a,v in zip(args,[*args[1:],None]) if a in PARSE_FLAGS and v is not None ]
+    return " ".join(flags)
+
+@lru_cache(maxsize=None)
+def vw_version() -> str:
+    return subprocess.run(['vw', '--version'], capture_output=True, text=True).stdout.strip()
+
+class VWCache:
+    """The shared binary cache of a VW data file for models with the same label type and parsing flags."""
+
+    def __init__(self, data: str, args: str, caches: str = "./caches") -> None:
+        """
+        Args:
+            data: The VW text file to cache.
+            args: The arguments of a model that will read the cache.
+            caches: The directory caches are written to.
+        """
+        tokens    = shlex.split(args)
+        self.data = Path(data)
+        self.args = f"{label_args(tokens)} {parse_args(tokens)}".strip()
+        self.path = Path(caches)/f"{self.data.name}.{hashlib.sha1(self.args.encode()).hexdigest()[:8]}.cache"
+
+    @property
+    def manifest(self) -> Path:
+        return self.path.with_name(self.path.name + ".json")
+
+    def source(self) -> Mapping[str,Any]:
+        """What a cache built now would be built from."""
+        stat = self.data.stat()
+        return {'data': str(self.data.resolve()), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'args': self.args, 'vw': vw_version()}
+
+    def stale(self) -> Optional[str]:
+        """Why the cache needs to be built, or None if it can be used as is."""
+        if not self.path.exists() or not self.manifest.exists(): return "it hasn't been built"
+
+        #a cache outlives its data file so multi-gigabyte text files can be deleted once parsed
+        if not self.data.exists(): return None
+
+        built, now = json.loads(self.manifest.read_text()), self.source()
+
+        if built['vw'] != now['vw']: return f"it was built by VW {built['vw']}"
+        if [built['size'], built['mtime_ns']] != [now['size'], now['mtime_ns']]: return f"{self.data} changed since it was built"
+
+        return None
+
+    def job(self) -> Job:
+        """A job that builds the cache."""
+        cmd = f"{shlex.quote(sys.executable)} -m jobs.caches {shlex.quote(str(self.data))} {shlex.quote(self.args)} {shlex.quote(str(self.path.parent))}"
+        return Job(f"cache_{self.path.name}", cmd, cost=self.data.stat().st_size if self.data.exists() else 0)
+
+    def build(self) -> None:
+        """Parse the data file into the cache and record what it was built from."""
+
+        #the source is read first so a data file that changes mid-build leaves the cache stale
+        source = self.source()
+        tmp    = self.path.with_name(self.path.name + ".writing")
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp.unlink(missing_ok=True)
+
+        subprocess.run(['vw', str(self.data), '--cache_file', str(tmp), *shlex.split(self.args), '--quiet'], check=True)
+
+        tmp.replace(self.path)
+        self.manifest.write_text(json.dumps(source))
+
+if __name__ == '__main__':
+    VWCache(*sys.argv[1:4]).build()
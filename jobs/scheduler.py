@@ -0,0 +1,150 @@
+"""Run command line jobs concurrently, longest first, within core and memory limits."""
+
+import os
+import json
+import time
+import shlex
+
+from pathlib import Path
+from subprocess import Popen, STDOUT
+from typing import Sequence, Mapping, Any, Iterable, Callable, Dict, Tuple
+
+class Job:
+    """A command line job with an estimated cost, an estimated memory need and prerequisites."""
+
+    def __init__(self,
+        name     : str,
+        cmd      : str,
+        cost     : float = 0,
+        memory   : int = 0,
+        cores    : int = 1,
+        after    : Sequence['Job'] = (),
+        summarize: Callable[[str],Mapping[str,Any]] = None) -> None:
+        """
+        Args:
+            name: A unique name for the job (also used to name its output log).
+            cmd: The command line to execute (it is run directly, not through a shell).
+            cost: The relative run time of the job. Jobs with higher costs are started first.
+            memory: The number of bytes the job is expected to need while running.
+            cores: The number of cores the job keeps busy while running (e.g., its worker processes).
+            after: Jobs that must finish successfully before this job can start.
+            summarize: Turns the job's output into extra fields for its record.
+        """
+        self.name      = name
+        self.cmd       = cmd
+        self.cost      = cost
+        self.memory    = memory
+        self.cores     = cores
+        self.after     = list(after)
+        self.summarize = summarize
+
+def vw_summary(output: str) -> Mapping[str,str]:
+    """Read the `key = value` lines VW prints when it finishes."""
+    summary = {}
+    for line in output.splitlines():
+        key, sep, value = line.partition(" = ")
+        if sep: summary[key.strip()] = value.strip()
+    return summary
+
+def vw_memory(bits: int, stride: int = 4) -> int:
+    """Estimate the bytes a VW weight table needs (4 byte floats with `stride` values per weight)."""
+    return 4 * stride * 2**bits
+
+def total_memory() -> int:
+    return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+
+class Scheduler:
+    """Run jobs as child processes, waking only when a child exits.
+
+    Ready jobs are started in order of decreasing cost while the cores and the memory of all
+    running jobs stay within budget (a job is always started if nothing else is running).
+    Finished jobs are reported as records built from the kernel's resource usage for the
+    child rather than from parsing its output. Every record has a `status` of `succeeded`,
+    `failed` or `skipped` (a job whose prerequisite failed, with the `reason` it never ran).
+    """
+
+    def __init__(self, processes: int = None, memory: int = None, logs: str = "./logs", records: str = None) -> None:
+        """
+        Args:
+            processes: The most cores running jobs may use at once (defaults to the number of cores).
+            memory: The memory budget in bytes for running jobs (defaults to 90% of RAM).
+            logs: The directory where each job's output is written.
+            records: An optional json lines file that each job record is appended to.
+        """
+        self._processes = processes or os.cpu_count()
+        self._memory    = memory or int(.9*total_memory())
+        self._logs      = Path(logs)
+        self._records   = records
+
+    def run(self, jobs: Sequence[Job]) -> Iterable[Mapping[str,Any]]:
+        """Run the jobs, yielding a record as each job finishes."""
+
+        if any(a not in jobs for j in jobs for a in j.after):
+            raise ValueError("Every prerequisite of a job must also be scheduled.")
+
+        self._logs.mkdir(parents=True, exist_ok=True)
+
+        pending  = sorted(jobs, key=lambda j: j.cost, reverse=True)
+        running  : Dict[int,Tuple[Job,Popen,float]] = {}
+        finished = set()
+        failed   = set()
+
+        while pending or running:
+
+            for job in list(pending):
+                if sum(j.cores for j,_,_ in running.values()) >= self._processes: break
+
+                if any(a in failed for a in job.after):
+                    pending.remove(job)
+                    failed.add(job)
+                    yield self._write({'job': job.name, 'status': 'skipped', 'reason': 'a prerequisite failed'})
+                    continue
+
+                ready  = all(a in finished for a in job.after)
+                fits   = not running or (
+                    sum(j.memory for j,_,_ in running.values()) + job.memory <= self._memory and
+                    sum(j.cores  for j,_,_ in running.values()) + job.cores  <= self._processes
+                )
+
+                if ready and fits:
+                    pending.remove(job)
+                    with open(self._log(job), "w") as log:
+                        process = Popen(shlex.split(job.cmd), stdout=log, stderr=STDOUT)
+                    running[process.pid] = (job, process, time.perf_counter())
+
+            if not running:
+                if not pending: break
+                #a job skipped on this pass may leave its own dependents to skip on the next
+                if any(a in failed for j in pending for a in j.after): continue
+                raise RuntimeError("The remaining jobs can never become ready.")
+
+            pid, status, usage = os.wait4(-1, 0)
+            if pid not in running: continue
+
+            job, process, start = running.pop(pid)
+            process.returncode  = os.waitstatus_to_exitcode(status)
+
+            record = {
+                'job'       : job.name,
+                'status'    : 'succeeded' if process.returncode == 0 else 'failed',
+                'returncode': process.returncode,
+                'wall'      : time.perf_counter()-start,
+                'user'      : usage.ru_utime,
+                'sys'       : usage.ru_stime,
+                #linux keeps the forking parent's rss as a floor for the child's peak
+                'max_rss'   : usage.ru_maxrss*1024,
+            }
+
+            if job.summarize:
+                record.update(job.summarize(self._log(job).read_text()))
+
+            (finished if process.returncode == 0 else failed).add(job)
+            yield self._write(record)
+
+    def _log(self, job: Job) -> Path:
+        return self._logs / f"{job.name}.log"
+
+    def _write(self, record: Mapping[str,Any]) -> Mapping[str,Any]:
+        if self._records:
+            with open(self._records, "a") as f: f.write(json.dumps(record)+"\n")
+        return record
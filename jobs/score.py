@@ -0,0 +1,120 @@
+"""Score a trained VW model on a test file with forked workers that share the model's weights.
+
+Test examples are independent once a model is frozen so `--testonly` scoring can be split.
+The model is loaded once and workers are forked after it is loaded, so every worker reads
+the same copy-on-write weights instead of loading a copy of its own. Each worker scores byte
+ranges of the test file, and the workers' loss sums and latency histograms are merged, so
+the result is exactly what a single process scoring the whole file would report.
+
+Run `python -m jobs.score ./models/aloi_oaa ./data/aloi_test.vw --workers 8`. The summary is
+printed as `key = value` lines like VW's own so it can be read with `vw_summary`.
+"""
+
+import os
+import argparse
+import multiprocessing as mp
+
+from time import perf_counter_ns
+from typing import Iterable, Mapping, Sequence, Tuple
+
+from vowpalwabbit import Workspace
+
+from learners.profiling import LatencyHistogram
+
+#the model workers are forked with (set by evaluate)
+_workspace: Workspace = None
+
+def chunks(path: str, n: int) -> Sequence[Tuple[int,int]]:
+    """Split a file into n byte ranges of (nearly) equal size."""
+    bounds = [ os.path.getsize(path)*i//n for i in range(n+1) ]
+    return list(zip(bounds, bounds[1:]))
+
+def lines(path: str, start: int, stop: int) -> Iterable[str]:
+    """The lines of a file whose first byte is in [start, stop)."""
+    with open(path, 'rb') as f:
+        #a line that straddles start belongs to the previous range
+        if start:
+            f.seek(start-1)
+            f.readline()
+
+        while f.tell() < stop:
+            line = f.readline()
+            if not line: break
+            yield line.decode()
+
+def score(path: str, start: int, stop: int) -> Tuple[int,float,float,LatencyHistogram]:
+    """Score the examples in a byte range of a test file with the forked model."""
+    examples, weight, loss, latency = 0, 0., 0., LatencyHistogram()
+
+    for line in lines(path, start, stop):
+        if not line.strip(): continue
+
+        example = _workspace.parse(line)
+
+        begin      = perf_counter_ns()
+        prediction = _workspace.predict(example)
+        latency.record(perf_counter_ns()-begin)
+
+        examples += 1
+        weight   += example.get_multiclass_weight()
+        loss     += example.get_multiclass_weight() * (prediction != example.get_multiclass_label())
+
+        _workspace.finish_example(example)
+
+    return examples, weight, loss, latency
+
+def evaluate(model: str, data: str, workers: int = None) -> Mapping[str,float]:
+    """Score a multiclass model on a test file with one loaded copy of the model.
+
+    Args:
+        model: A model written by `vw -f`.
+        data: A VW text file of labeled test examples.
+        workers: The number of processes scoring the file (defaults to the number of cores).
+
+    Returns:
+        VW's summary fields (number of examples, weighted example sum and average loss) and
+        predict latency statistics in microseconds.
+    """
+    global _workspace
+
+    workers = workers or os.cpu_count()
+    ranges  = [ (data, *r) for r in chunks(data, 4*workers) ]
+
+    _workspace = Workspace(f"-i {model} --testonly --quiet")
+
+    try:
+        if workers == 1:
+            results = [ score(*r) for r in ranges ]
+        else:
+            #several ranges per worker so a worker that finishes early picks up another range
+            with mp.get_context('fork').Pool(workers) as pool:
+                results = pool.starmap(score, ranges, chunksize=1)
+    finally:
+        _workspace.finish()
+        _workspace = None
+
+    latency = LatencyHistogram()
+    for *_, histogram in results: latency.merge(histogram)
+
+    examples = sum(r[0] for r in results)
+    weight   = sum(r[1] for r in results)
+    loss     = sum(r[2] for r in results)
+
+    return {
+        'number of examples'  : examples,
+        'weighted example sum': weight,
+        'average loss'        : loss/weight if weight else float('nan'),
+        'predict mean us'     : latency.mean/1000,
+        'predict p50 us'      : latency.percentile(50)/1000,
+        'predict p99 us'      : latency.percentile(99)/1000,
+    }
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Score a trained VW multiclass model on a test file in parallel.")
+    parser.add_argument("model")
+    parser.add_argument("data")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    for key, value in evaluate(args.model, args.data, args.workers).items():
+        print(f"{key} = {value}")
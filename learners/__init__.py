@@ -1,26 +1,162 @@
-from math import log2
-from itertools import count, chain
-from typing import Hashable, Sequence, Mapping, Any
+import os
+import pickle
+import tempfile
+from math import log2, prod
+from collections import OrderedDict
+from itertools import count, chain, islice
+from typing import Hashable, Sequence, Mapping, Any, Optional, Tuple
 
 from coba.random import CobaRandom
+from coba.context import CobaContext
 from coba.learners import VowpalMediator
 
+from learners.profiling import Profiler, ProfiledMediator
+from learners.footprint import FootprintSampler
+
 MemVal = Any
 
+def dump_vw(mediator: VowpalMediator) -> bytes:
+    """Serialize the model of an initialized mediator along with its feature naming."""
+    fd, path = tempfile.mkstemp(suffix=".vw")
+    os.close(fd)
+    try:
+        mediator._vw.save(path)
+        with open(path, "rb") as f: model = f.read()
+    finally:
+        os.remove(path)
+
+    return pickle.dumps((model, mediator._ns_keys, mediator._ns_keys_cnt))
+
+def load_vw(state: bytes, label_type: int) -> VowpalMediator:
+    """Create a mediator from the output of dump_vw."""
+    model, ns_keys, ns_keys_cnt = pickle.loads(state)
+
+    fd, path = tempfile.mkstemp(suffix=".vw")
+    try:
+        with os.fdopen(fd, "wb") as f: f.write(model)
+        mediator = VowpalMediator().init_learner(f"-i {path} --quiet --preserve_performance_counters", label_type)
+    finally:
+        os.remove(path)
+
+    mediator._ns_keys     = ns_keys
+    mediator._ns_keys_cnt = ns_keys_cnt
+
+    return mediator
+
+class HashCache:
+    """A bounded LRU cache of VW-hashed namespace features.
+
+    Entries are keyed on the identity of the features object and hold a reference to
+    it so the identity can't be reused while the entry is alive. This lets the context
+    of an interaction be hashed once and reused by every action query and the learn.
+    """
+
+    def __init__(self, size: int) -> None:
+        self._size  = size
+        self._items : OrderedDict = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def get(self, ns: str, feats: Any, hasher) -> Any:
+        key   = (ns, id(feats))
+        entry = self._items.get(key)
+
+        if entry is not None and entry[0] is feats:
+            self._items.move_to_end(key)
+            return entry[1]
+
+        hashed = hasher(ns, feats)
+
+        if self._size > 0:
+            self._items[key] = (feats, hashed)
+            if len(self._items) > self._size: self._items.popitem(last=False)
+
+        return hashed
+
+    def clear(self) -> None:
+        self._items.clear()
+
 class VWC:
 
-    def __init__(self, args:str, weight:bool=False) -> None:
+    def __init__(self, args:str, weight:bool=False, cache:int=1024, persist:bool=False) -> None:
         self._vw_args = args
         self._vw = VowpalMediator()
         self._rng = CobaRandom(1)
         self._weight = weight
+        self._cache = HashCache(cache)
+        self._persist = persist
+        self._profiler = None
 
     @property
     def params(self) -> Mapping[str,Any]:
         return {'args': self._vw_args, 'w':self._weight}
 
     def __reduce__(self):
-        return (VWC, (self._vw_args,self._weight))
+        return (VWC, (self._vw_args,self._weight,self._cache._size,self._persist), self._state())
+
+    def __setstate__(self, state: Mapping[str,Any]) -> None:
+        if 'model' in state:
+            self._act     = state['act']
+            self._map     = dict(chain(zip(count(1),self._act), zip(self._act,count(1))))
+            self._rng     = state['rng']
+            self._vw      = self._load_model(state['model'])
+            self._persist = True
+
+        if 'profiler' in state:
+            self.profile(state['profiler'])
+
+    def profile(self, profiler: Optional[Profiler]) -> 'VWC':
+        """Time example construction, VW predicts and VW learns (None turns profiling off)."""
+
+        #we swap in timed callables rather than checking a flag so that
+        #learners which aren't being profiled pay no overhead at all
+        if self._profiler:
+            self._vw = self._vw.mediator
+            del self._make_example
+
+        self._profiler = profiler
+
+        if profiler:
+            self._make_example = profiler.timed("make_example", self._make_example)
+            self._vw           = ProfiledMediator(self._vw, profiler)
+
+        return self
+
+    def save(self, path: str) -> None:
+        """Write this learner, including anything it has learned, to disk."""
+        #the model is always written, whatever __reduce__ would pickle for this learner
+        cls, args, _ = self.__reduce__()
+        with open(path, "wb") as f:
+            pickle.dump((cls, args, self._state(force=True)), f)
+
+    @staticmethod
+    def load(path: str) -> 'VWC':
+        """Read a learner written by save. The learner keeps its state when pickled."""
+        with open(path, "rb") as f:
+            cls, args, state = pickle.load(f)
+
+        learner = cls(*args)
+        if state is not None: learner.__setstate__(state)
+        return learner
+
+    def _state(self, force: bool = False) -> Optional[Mapping[str,Any]]:
+        #without a model unpickling falls back to the constructor and starts cold
+        state = {}
+
+        if (self._persist or force) and self._vw.is_initialized:
+            state.update({'act': self._act, 'rng': self._rng, 'model': self._dump_model()})
+
+        if self._profiler:
+            state['profiler'] = self._profiler
+
+        return state or None
+
+    def _dump_model(self) -> Any:
+        return dump_vw(self._vw)
+
+    def _load_model(self, model: Any) -> Any:
+        return load_vw(model, 2)
 
     def set_params(self,actions):
         if not self._vw.is_initialized:
@@ -28,18 +164,60 @@ class VWC:
             self._map = dict(chain(zip(count(1),actions), zip(actions,count(1))))
             self._vw.init_learner(str.format(self._vw_args,len(actions)), label_type=2)
 
+    @property
+    def footprint(self) -> Mapping[str,int]:
+        """The live memory count and approximate memory bytes (empty when not tracked)."""
+        return {}
+
     def predict(self, features: Mapping) -> MemVal:
-        pr = self._vw.predict(self._vw.make_example(features, None))
+        pr = self._vw.predict(self._make_example(features, None))
         return self._map[pr] if pr != 0 else self._rng.choice(self._act)
 
+    def predict_batch(self, context: Any, actions: Sequence[Any]) -> Sequence[MemVal]:
+        """Query the memory for every action paired with one context."""
+        preds = [ self._vw.predict(self._make_example({'x':context,'a':a}, None)) for a in actions ]
+        return [ self._map[pr] if pr != 0 else self._rng.choice(self._act) for pr in preds ]
+
+    def predict_many(self, queries: Sequence[Tuple[Any,Sequence[Any]]]) -> Sequence[Sequence[MemVal]]:
+        """Query the memory for several (context, actions) pairs (e.g., the requests of a micro-batch)."""
+        return [ self.predict_batch(context, actions) for context, actions in queries ]
+
     def learn(self, features: Mapping, value: Any, weight: float):
-        self._vw.learn(self._vw.make_example(features, f"{self._map[value]} {weight if self._weight else 1}"))
+        self._vw.learn(self._make_example(features, f"{self._map[value]} {weight if self._weight else 1}"))
+
+    def _hash(self, ns: str, feats: Any) -> Mapping[int,float]:
+        #we name features with the mediator so hashes match VowpalMediator.make_example
+        workspace = self._vw._vw
+        ns_hash   = workspace.hash_space(ns)
+        return { (k if isinstance(k,int) else workspace.hash_feature(k,ns_hash)): v for _,d in self._vw._prep_namespaces({ns:feats}) for k,v in d.items() }
+
+    def _make_example(self, features: Mapping, label: Optional[str]) -> Any:
+        #VW computes interactions (e.g., xa) from these hashed namespaces when it
+        #sees the example so caching the namespaces also covers the interactions
+        workspace = self._vw._vw
+        example   = self._vw._example_init(workspace, None, self._vw._label_type)
+        example.push_feature_dict(workspace, { ns: self._cache.get(ns, feats, self._hash) for ns, feats in features.items() })
+
+        if label is not None: example.set_label_string(label)
+        example.setup_example()
+
+        return example
 
 class EMT(VWC):
 
-    def __init__(self, split:int = 100, scorer:str="self_consistent_rank", router:str="eigen", bound:int=0, interactions: Sequence[str]=[], weight:bool = False, rng : int = 1337) -> None:
+    def __init__(self, split:int = 100, scorer:str="self_consistent_rank", router:str="eigen", bound:int=0, interactions: Sequence[str]=[], weight:bool = False, rng : int = 1337, engine:str = "vw", eviction:str = "lru", persist:bool = False, bits: Optional[int] = None) -> None:
+
+        if engine not in ["vw", "numpy"]:
+            raise ValueError(f"Unknown EMT engine {engine}.")
+
+        #VW's emt bounder is always least recently used
+        if engine == "vw" and eviction != "lru":
+            raise ValueError(f"The vw EMT engine only supports lru eviction (use engine='numpy' for {eviction}).")
 
-        self._args = (split, scorer, router, bound, interactions, weight, rng)
+        self._args       = (split, scorer, router, bound, interactions, weight, rng, engine, eviction, persist, bits)
+        self._engine     = engine
+        self._n_learned  = 0
+        self._n_features = 0
 
         vw_args = [
             "--emt",
@@ -51,26 +229,96 @@ class EMT(VWC):
             "--max_prediction 3",
             "--coin",
             "--noconstant",
-            f"-b {26}",
+            f"-b {bits or 26}",
             "--initial_weight 0",
             *[ f"--interactions {i}" for i in interactions ],
         ]
 
-        super().__init__(f"{' '.join(vw_args)} --quiet --random_seed {rng}", weight)
+        super().__init__(f"{' '.join(vw_args)} --quiet --random_seed {rng}", weight, persist=persist)
+
+        if engine == "numpy":
+            from learners.eigen import EigenMemoryTree
+            #the numpy engine stores dense 2**bits vectors so it defaults to far fewer bits than VW
+            self._vw = EigenMemoryTree(split, scorer, router, bound, interactions, eviction, bits=bits or 10, rng=rng)
 
     def __reduce__(self):
-        return (EMT, self._args)
+        return (EMT, self._args, self._state())
+
+    def __setstate__(self, state: Mapping[str,Any]) -> None:
+        super().__setstate__(state)
+        if 'counts' in state: self._n_learned, self._n_features = state['counts']
+
+    def _state(self, force: bool = False) -> Optional[Mapping[str,Any]]:
+        state = super()._state(force)
+        return { **state, 'counts': (self._n_learned, self._n_features) } if state and 'model' in state else state
+
+    def _dump_model(self) -> Any:
+        return super()._dump_model() if self._engine == "vw" else self._vw
+
+    def _load_model(self, model: Any) -> Any:
+        return super()._load_model(model) if self._engine == "vw" else model
 
     @property
     def params(self) -> Mapping[str,Any]:
-        keys = ['split', 'scorer', 'router', 'bound', 'X', 'w']
-        return { 'type':'EMT', **dict(zip(keys,self._args))}
+        keys   = ['split', 'scorer', 'router', 'bound', 'X', 'w']
+        engine = {} if self._engine == "vw" else {'engine': self._engine}
+        evict  = {} if self._args[8] == "lru" else {'evict': self._args[8]}
+        bits   = {} if self._args[10] is None else {'bits': self._args[10]}
+        return { 'type':'EMT', **dict(zip(keys,self._args)), **engine, **evict, **bits}
+
+    @property
+    def footprint(self) -> Mapping[str,int]:
+        bound = self._args[3]
+
+        if not bound: return {}
+        if self._engine == "numpy": return self._vw.footprint
+
+        #VW doesn't expose its memories so we assume every learned example becomes a
+        #memory and that each feature costs a 4 byte value plus an 8 byte index
+        memories = min(self._n_learned, bound)
+        return {'memories': memories, 'memory_bytes': int(12*memories*self._n_features/max(self._n_learned,1)) }
+
+    def learn(self, features: Mapping, value: Any, weight: float):
+        super().learn(features, value, weight)
+
+        if self._engine == "vw" and self._args[3]:
+            sizes = { ns[0]: len(self._cache.get(ns, feats, self._hash)) for ns,feats in features.items() }
+            self._n_learned  += 1
+            self._n_features += sum(sizes.values()) + sum(prod(sizes.get(c,0) for c in i) for i in self._args[4])
+
+    def predict_batch(self, context: Any, actions: Sequence[Any]) -> Sequence[MemVal]:
+        #VW's emt reduction predicts one example per call so only the numpy tree is batched
+        #and a few actions are cheaper to query one at a time than to pay the batch overhead
+        if self._engine == "vw" or len(actions) < 8: return super().predict_batch(context, actions)
+
+        shared = {'x': self._cache.get('x', context, self._hash)}
+        each   = [ {'a': self._cache.get('a', a, self._hash)} for a in actions ]
+        preds  = self._vw.predict_batch(self._vw.make_batch(shared, each))
+
+        return [ self._map[pr] if pr != 0 else self._rng.choice(self._act) for pr in preds ]
+
+    def predict_many(self, queries: Sequence[Tuple[Any,Sequence[Any]]]) -> Sequence[Sequence[MemVal]]:
+        #every query's rows are routed and scored by the numpy tree in one pass
+        if self._engine == "vw" or sum(len(a) for _,a in queries) < 8: return super().predict_many(queries)
+
+        import numpy as np
+        batches = [ self._vw.make_batch({'x': self._cache.get('x', c, self._hash)}, [ {'a': self._cache.get('a', a, self._hash)} for a in A ]) for c,A in queries ]
+        preds   = iter(self._vw.predict_batch(np.concatenate(batches)))
+
+        return [ [ self._map[pr] if pr != 0 else self._rng.choice(self._act) for pr in islice(preds, len(A)) ] for _,A in queries ]
+
+    def _hash(self, ns: str, feats: Any):
+        return super()._hash(ns, feats) if self._engine == "vw" else self._vw.hash(ns, feats)
+
+    def _make_example(self, features: Mapping, label: Optional[str]) -> Any:
+        if self._engine == "vw": return super()._make_example(features, label)
+        return self._vw.make_example({ns: self._cache.get(ns, feats, self._hash) for ns,feats in features.items()}, label)
 
 class CMT(VWC):
 
-    def __init__(self, mems_per_leaf:int=100, dream_repeats:int=5, alpha:float=0.5, lr:int=.001, coin:bool = True, interactions: Sequence[str]=[], max_nodes:int=100, learn_at_leaf:bool=True, weight:bool = False, rng : int = 1337) -> None:
+    def __init__(self, mems_per_leaf:int=100, dream_repeats:int=5, alpha:float=0.5, lr:int=.001, coin:bool = True, interactions: Sequence[str]=[], max_nodes:int=100, learn_at_leaf:bool=True, weight:bool = False, rng : int = 1337, persist:bool = False) -> None:
 
-        self._init_args = (mems_per_leaf, dream_repeats, alpha, lr, coin, interactions, max_nodes, learn_at_leaf, weight, rng)
+        self._init_args = (mems_per_leaf, dream_repeats, alpha, lr, coin, interactions, max_nodes, learn_at_leaf, weight, rng, persist)
 
         #leaf splits when 
             # n_leaf_examples >= leaf_example_multiplier*log2(tree->max_nodes)
@@ -92,10 +340,10 @@ class CMT(VWC):
         ]
 
         if coin: vw_args.append("--coin")
-        super().__init__(f"{' '.join(vw_args)} --quiet --random_seed {rng}", weight)
+        super().__init__(f"{' '.join(vw_args)} --quiet --random_seed {rng}", weight, persist=persist)
 
     def __reduce__(self):
-        return (CMT, self._init_args)
+        return (CMT, self._init_args, self._state())
 
     @property
     def params(self) -> Mapping[str,Any]:
@@ -111,11 +359,17 @@ class EpisodicLearner:
         self._epsilon = epsilon
         self._i       = 0
         self._mem     = mem
+        self._sampler = None
 
     @property
     def params(self) -> Mapping[str,Any]:
         return { 'family': 'EpisodicLearner','e':self._epsilon, **self._mem.params }
 
+    def track(self, every: int = 1000) -> 'EpisodicLearner':
+        """Log resident memory, VW weight memory and the memory count every `every` learns (0 turns it off)."""
+        self._sampler = FootprintSampler(every) if every else None
+        return self
+
     def predict(self, context: Hashable, actions: Sequence[Hashable]) -> Sequence[float]:
         """Choose which action index to take."""
 
@@ -124,7 +378,20 @@ class EpisodicLearner:
 
         self._i += 1
 
-        rewards = [int(self._mem.predict({'x':context,'a':a})) for a in actions]
+        return self._probs(actions, self._mem.predict_batch(context, actions))
+
+    def predict_many(self, requests: Sequence[Tuple[Hashable,Sequence[Hashable]]]) -> Sequence[Tuple[Sequence[float],Mapping[str,Any]]]:
+        """Choose an action for several (context, actions) requests with one memory query."""
+
+        if self._i == 0:
+            self._mem.set_params(['0','1'])
+
+        self._i += len(requests)
+
+        return [ self._probs(actions, values) for (_,actions), values in zip(requests, self._mem.predict_many(requests)) ]
+
+    def _probs(self, actions: Sequence[Hashable], values: Sequence[MemVal]) -> Tuple[Sequence[float],Mapping[str,Any]]:
+        rewards = list(map(int,values))
 
         greedy_r = -float('inf')
         greedy_A = []
@@ -148,10 +415,11 @@ class EpisodicLearner:
     def learn(self, context: Hashable, action: Hashable, reward: float, probability: float, actions: Sequence[Hashable]) -> None:
         """Learn about the result of an action that was taken in a context."""
         self._mem.learn({'x':context,'a':action}, str(reward), weight=1./(len(actions)*probability))
+        if self._sampler: CobaContext.learning_info.update(self._sampler.sample(self._mem))
 
 class StackedLearner:
 
-    def __init__(self, epsilon: float, mem: EMT, X:str, coin:bool, constant:bool) -> None:
+    def __init__(self, epsilon: float, mem: EMT, X:str, coin:bool, constant:bool, persist:bool=False) -> None:
 
         assert 0 <= epsilon and epsilon <= 1
 
@@ -159,6 +427,8 @@ class StackedLearner:
         self._i       = 0
         self._mem     = mem
         self._args    = (X, coin, constant)
+        self._persist = persist
+        self._sampler = None
 
         if X == 'xa':
             args = f"--quiet --cb_explore_adf --epsilon {epsilon} --ignore_linear x --interactions xa --random_seed {1}"
@@ -178,6 +448,11 @@ class StackedLearner:
     def params(self) -> Mapping[str,Any]:
         return { 'family': 'ComboLearner', 'e': self._epsilon, **self._mem.params, "other": self._args }
 
+    def track(self, every: int = 1000) -> 'StackedLearner':
+        """Log resident memory, VW weight memory (both models) and the memory count every `every` learns."""
+        self._sampler = FootprintSampler(every) if every else None
+        return self
+
     def predict(self, context: Hashable, actions: Sequence[Hashable]) -> Sequence[float]:
         """Choose which action index to take."""
 
@@ -186,7 +461,20 @@ class StackedLearner:
 
         self._i += 1
 
-        memories = [ int(self._mem.predict({'x':context,'a':a})) for a in actions ]
+        return self._stack(context, actions, self._mem.predict_batch(context, actions))
+
+    def predict_many(self, requests: Sequence[Tuple[Hashable,Sequence[Hashable]]]) -> Sequence[Tuple[Sequence[float],Mapping[str,Any]]]:
+        """Choose an action for several (context, actions) requests with one memory query."""
+
+        if self._i == 0:
+            self._mem.set_params(['0','1'])
+
+        self._i += len(requests)
+
+        return [ self._stack(context, actions, values) for (context,actions), values in zip(requests, self._mem.predict_many(requests)) ]
+
+    def _stack(self, context: Hashable, actions: Sequence[Hashable], values: Sequence[MemVal]) -> Tuple[Sequence[float],Mapping[str,Any]]:
+        memories = list(map(int,values))
         adfs     = [ {'a':a, 'm':m }  for a,m in zip(actions,memories) ]
         probs    = self._vw.predict(self._vw.make_examples({'x':context}, adfs, None))
 
@@ -196,6 +484,7 @@ class StackedLearner:
         """Learn about the result of an action that was taken in a context."""
 
         self._mem.learn({'x':context,'a':action}, str(reward), weight=1./(len(actions)*probability))
+        if self._sampler: CobaContext.learning_info.update(self._sampler.sample(self._mem, self._vw))
         labels = self._labels(actions, action, reward, probability)
         self._vw.learn(self._vw.make_examples({'x':context}, adfs, labels))
 
@@ -203,4 +492,21 @@ class StackedLearner:
         return [ f"{i+1}:{round(-reward,5)}:{round(prob,5)}" if a == action else None for i,a in enumerate(actions)]
 
     def __reduce__(self):
-        return (type(self), (self._epsilon, self._mem, *self._args))
+        state = {'i': self._i, 'model': dump_vw(self._vw)} if self._persist else {}
+
+        #the memory pickles with its own persist flag so a persisted stack also carries a memory that doesn't
+        if self._persist and hasattr(self._mem, '_state') and not self._mem._persist:
+            state['mem'] = self._mem._state(force=True)
+
+        if self._sampler: state['sampler'] = self._sampler
+        return (type(self), (self._epsilon, self._mem, *self._args, self._persist), state or None)
+
+    def __setstate__(self, state: Mapping[str,Any]) -> None:
+        if 'model' in state:
+            if state.get('mem'): self._mem.__setstate__(state['mem'])
+
+            #a memory that comes back untrained (e.g., a ShardedEMT) still needs set_params
+            self._i  = state['i'] if getattr(getattr(self._mem, '_vw', None), 'is_initialized', False) else 0
+            self._vw = load_vw(state['model'], 4)
+
+        self._sampler = state.get('sampler')
@@ -0,0 +1,423 @@
+"""A pure NumPy eigen memory tree that can stand in for VW's `--emt` reduction."""
+
+import heapq
+from collections import OrderedDict
+from itertools import count
+from typing import Sequence, Mapping, Any, Optional, Tuple, List, Iterable
+from zlib import crc32
+
+import numpy as np
+
+Hashed  = Tuple[np.ndarray,np.ndarray]
+Example = Tuple[np.ndarray,Optional[int],float]
+
+def named_features(feats: Any) -> Iterable[Tuple[str,float]]:
+    """Turn coba formatted features into (name,value) pairs."""
+    if feats is None or feats == [] or feats == ():
+        return []
+    if isinstance(feats,str):
+        return [(feats,1)]
+    if isinstance(feats,(int,float)):
+        return [("0",feats)]
+    if isinstance(feats,Mapping):
+        return [ (f"{k}={v}",1) if isinstance(v,str) else (str(k),v) for k,v in feats.items() ]
+    return [ (f"{i}={f}",1) if isinstance(f,str) else (str(i),f) for i,f in enumerate(feats) ]
+
+class MemoryBank:
+    """Contiguous storage for memory keys and values with slot reuse."""
+
+    def __init__(self, dim: int, capacity: int = 256) -> None:
+        self.X     = np.zeros((capacity,dim), dtype=np.float32)
+        self.y     = np.zeros(capacity, dtype=np.int32)
+        self._n    = 0
+        self._free : List[int] = []
+
+    def __len__(self) -> int:
+        return self._n - len(self._free)
+
+    @property
+    def nbytes(self) -> int:
+        return self.X.nbytes + self.y.nbytes
+
+    def add(self, x: np.ndarray, y: int) -> int:
+        if self._free:
+            i = self._free.pop()
+        else:
+            if self._n == len(self.y): self._grow()
+            i = self._n
+            self._n += 1
+
+        self.X[i] = x
+        self.y[i] = y
+        return i
+
+    def remove(self, i: int) -> None:
+        self._free.append(i)
+
+    def _grow(self) -> None:
+        self.X = np.concatenate([self.X, np.zeros_like(self.X)])
+        self.y = np.concatenate([self.y, np.zeros_like(self.y)])
+
+class LRU:
+    """Evict the memory that was least recently inserted or returned by a query."""
+
+    def __init__(self) -> None:
+        self._order: OrderedDict = OrderedDict()
+
+    def add(self, i: int) -> None:
+        self._order[i] = None
+
+    def hit(self, i: int) -> None:
+        self._order.move_to_end(i)
+
+    def miss(self, i: int) -> None:
+        pass
+
+    def evict(self) -> int:
+        return self._order.popitem(last=False)[0]
+
+class FIFO(LRU):
+    """Evict the memory that was inserted first."""
+
+    def hit(self, i: int) -> None:
+        pass
+
+class LeastUseful:
+    """Evict the memory that the scorer has found least useful.
+
+    A memory gains a point each time a query returns it and loses a point each time
+    the scorer ranks it above a memory with the correct value. Ties go to the oldest.
+    """
+
+    def __init__(self) -> None:
+        self._utility: dict = {}
+        self._heap   : list = []
+        self._order         = count()
+
+    def add(self, i: int) -> None:
+        self._utility[i] = 0
+        heapq.heappush(self._heap, (0, next(self._order), i))
+
+    def hit(self, i: int) -> None:
+        self._update(i, 1)
+
+    def miss(self, i: int) -> None:
+        self._update(i, -1)
+
+    def evict(self) -> int:
+        while True:
+            utility, _, i = heapq.heappop(self._heap)
+            if self._utility.get(i) == utility:
+                del self._utility[i]
+                return i
+
+    def _update(self, i: int, change: int) -> None:
+        self._utility[i] += change
+        heapq.heappush(self._heap, (self._utility[i], next(self._order), i))
+
+        #stale entries are skipped lazily so rebuild once they dominate the heap
+        if len(self._heap) > 4*len(self._utility):
+            self._heap = [ (u, next(self._order), i) for i,u in self._utility.items() ]
+            heapq.heapify(self._heap)
+
+EVICTIONS = {'lru': LRU, 'fifo': FIFO, 'useful': LeastUseful}
+
+class Node:
+    __slots__ = ('parent','left','right','router','bias','mems','retry')
+
+    def __init__(self, parent: Optional['Node'] = None) -> None:
+        self.parent = parent
+        self.left   = None
+        self.right  = None
+        self.router = None
+        self.bias   = 0.
+        self.mems   : List[int] = []
+        self.retry  = 0
+
+    @property
+    def is_leaf(self) -> bool:
+        return self.left is None
+
+class EigenMemoryTree:
+    """An eigen memory tree with the same example protocol as coba's VowpalMediator.
+
+    Memories are dense hashed feature vectors kept in a MemoryBank. Internal nodes route
+    on the top principal component of the memories they held when they split and leaves
+    are scored with a single vectorized pass of a learned linear scorer.
+    """
+
+    def __init__(self, split:int = 100, scorer:str="self_consistent_rank", router:str="eigen", bound:int=0, interactions: Sequence[str]=[], eviction:str = "lru", bits:int = 10, rng:int = 1337) -> None:
+
+        if scorer not in ["self_consistent_rank", "not_self_consistent_rank"]:
+            raise ValueError(f"Unknown EMT scorer {scorer}.")
+
+        if router not in ["eigen", "random"]:
+            raise ValueError(f"Unknown EMT router {router}.")
+
+        if eviction not in EVICTIONS:
+            raise ValueError(f"Unknown EMT eviction {eviction}.")
+
+        self._split        = split
+        self._scorer       = scorer
+        self._router       = router
+        self._bound        = bound
+        self._interactions = list(interactions)
+        self._dim          = 2**bits
+        self._rng          = np.random.default_rng(rng)
+
+        self._root    = None
+        self._bank    = None
+        self._leaf_of : dict = {}
+        self._evictor = EVICTIONS[eviction]()
+        self._weights = None
+
+    @property
+    def is_initialized(self) -> bool:
+        return self._root is not None
+
+    @property
+    def footprint(self) -> Mapping[str,int]:
+        """The live memory count and the bytes allocated to memories, routers and the scorer."""
+        if not self.is_initialized: return {'memories': 0, 'memory_bytes': 0}
+        routers = sum(n.router.nbytes for n in self._nodes() if n.router is not None)
+        return {'memories': len(self._bank), 'memory_bytes': self._bank.nbytes + routers + self._weights.nbytes }
+
+    def init_learner(self, args: str, label_type: int) -> 'EigenMemoryTree':
+        self._root    = Node()
+        self._bank    = MemoryBank(self._dim)
+        self._weights = np.ones(self._dim, dtype=np.float32)
+        return self
+
+    def hash(self, ns: str, feats: Any) -> Hashed:
+        """Hash one namespace into parallel index and value arrays."""
+        pairs = [ (crc32(f"{ns[0]}^{name}".encode()), value) for name,value in named_features(feats) if value != 0 ]
+        index = np.array([p[0] for p in pairs], dtype=np.int64)
+        value = np.array([p[1] for p in pairs], dtype=np.float32)
+        return index, value
+
+    def make_example(self, namespaces: Mapping[str,Hashed], label: Optional[str]) -> Example:
+        x = self._add(np.zeros(self._dim, dtype=np.float32), namespaces, namespaces, self._interactions)
+
+        if label is None:
+            return x, None, 1.
+
+        y, *w = label.split()
+        return x, int(y), float(w[0]) if w else 1.
+
+    def make_batch(self, shared: Mapping[str,Hashed], each: Sequence[Mapping[str,Hashed]]) -> np.ndarray:
+        """The unlabeled example vectors, one per row, of examples that share namespaces (e.g., a context).
+
+        The shared namespaces and the interactions only among them are added once to a vector
+        that every row starts from so only the varying namespaces are added per row.
+        """
+        if not each: return np.zeros((0,self._dim), dtype=np.float32)
+
+        varied = { ns[0] for namespaces in each for ns in namespaces }
+        fixed  = [ i for i in self._interactions if not varied & set(i) ]
+        mixed  = [ i for i in self._interactions if varied & set(i) ]
+        base   = self._add(np.zeros(self._dim, dtype=np.float32), shared, shared, fixed)
+
+        #every row's features are scattered with a single bincount over (row,index) offsets
+        hashed = [ list(self._hashed(namespaces, {**shared, **namespaces}, mixed)) for namespaces in each ]
+        index  = np.concatenate([ r*self._dim + i % self._dim for r,pairs in enumerate(hashed) for i,_ in pairs ] or [np.zeros(0,dtype=np.int64)])
+        value  = np.concatenate([ v for pairs in hashed for _,v in pairs ] or [np.zeros(0,dtype=np.float32)])
+
+        return base + np.bincount(index, value, len(each)*self._dim).reshape(len(each),self._dim).astype(np.float32)
+
+    def predict(self, example: Example) -> int:
+        x    = example[0]
+        leaf = self._route(x)
+
+        if not leaf.mems: return 0
+
+        best = leaf.mems[int(np.argmax(self._scores(x[None], leaf.mems)[0]))]
+        if self._bound: self._evictor.hit(best)
+
+        return int(self._bank.y[best])
+
+    def predict_batch(self, X: np.ndarray) -> Sequence[int]:
+        """Predict for every row of X, routing the rows together and scoring each leaf's rows at once."""
+        best = np.full(len(X), -1)
+
+        for leaf, rows in self._route_batch(X):
+            if leaf.mems: best[rows] = np.asarray(leaf.mems)[np.argmax(self._scores(X[rows], leaf.mems), axis=1)]
+
+        #hits are made in row order so recency matches predicting the rows one at a time
+        if self._bound:
+            for i in best[best >= 0]: self._evictor.hit(int(i))
+
+        return np.where(best >= 0, self._bank.y[best], 0).tolist()
+
+    def learn(self, example: Example) -> None:
+        x, y, w = example
+        leaf    = self._route(x)
+
+        if leaf.mems: self._update_scorer(x, y, w, leaf.mems)
+
+        i = self._bank.add(x, y)
+        leaf.mems.append(i)
+        self._leaf_of[i] = leaf
+
+        if self._bound: self._evictor.add(i)
+
+        if self._bound and len(self._bank) > self._bound: self._evict()
+        if len(leaf.mems) > max(self._split, leaf.retry): self._split_leaf(leaf)
+
+    def _add(self, x: np.ndarray, namespaces: Mapping[str,Hashed], interacted: Mapping[str,Hashed], interactions: Sequence[str]) -> np.ndarray:
+        for index, value in self._hashed(namespaces, interacted, interactions):
+            np.add.at(x, index % self._dim, value)
+        return x
+
+    def _hashed(self, namespaces: Mapping[str,Hashed], interacted: Mapping[str,Hashed], interactions: Sequence[str]) -> Iterable[Hashed]:
+        #the namespaces along with the interactions over the interacted namespaces
+        yield from namespaces.values()
+
+        for interaction in interactions:
+            groups = [ [ interacted[ns] for ns in interacted if ns[0] == c ] for c in interaction ]
+            if not all(groups): continue
+            yield self._interact([ tuple(map(np.concatenate,zip(*group))) for group in groups ])
+
+    def _interact(self, hashed: Sequence[Hashed]) -> Hashed:
+        index, value = hashed[0]
+        for other_index, other_value in hashed[1:]:
+            index = ((index[:,None] * 16777619) ^ other_index[None,:]).ravel()
+            value = (value[:,None] * other_value[None,:]).ravel()
+
+        return index, value
+
+    def _route(self, x: np.ndarray, node: Optional[Node] = None) -> Node:
+        node = node or self._root
+        while not node.is_leaf:
+            node = node.left if x @ node.router <= node.bias else node.right
+        return node
+
+    def _route_batch(self, X: np.ndarray) -> Iterable[Tuple[Node,np.ndarray]]:
+        stack = [(self._root, np.arange(len(X)))]
+        while stack:
+            node, rows = stack.pop()
+            if not len(rows): continue
+            if node.is_leaf:
+                yield node, rows
+            elif len(rows) == 1:
+                #a lone row is cheaper to route on its own than by indexing X at every level
+                yield self._route(X[rows[0]], node), rows
+            else:
+                left = X[rows] @ node.router <= node.bias
+                stack.extend([(node.left, rows[left]), (node.right, rows[~left])])
+
+    def _features(self, x: np.ndarray, mems: Sequence[int]) -> np.ndarray:
+        M = self._bank.X[mems]
+        return -np.abs(M - x) if self._scorer == "self_consistent_rank" else M * x
+
+    def _scores(self, X: np.ndarray, mems: Sequence[int]) -> np.ndarray:
+        #the (rows,mems) scores of the rows of X against the memories in mems
+        M = self._bank.X[mems]
+        if self._scorer != "self_consistent_rank": return X @ (M * self._weights).T
+        if len(X) == 1: return (-np.abs(M - X) @ self._weights)[None]
+
+        #rows are sparse so -|M-x|@w is scored as -|M|@w, shared by every row, corrected
+        #on each row's nonzero features rather than with a dense (rows,mems,dim) pass
+        r, j = np.nonzero(X)
+        w    = self._weights[j]
+        D    = (np.abs(M[:,j] - X[r,j]) - np.abs(M[:,j])) * w
+
+        correction = np.zeros((len(X),len(mems)), dtype=np.float32)
+        rows, starts = np.unique(r, return_index=True)
+        if len(rows): correction[rows] = np.add.reduceat(D, starts, axis=1).T
+
+        return -(np.abs(M) @ self._weights + correction)
+
+    def _update_scorer(self, x: np.ndarray, y: int, w: float, mems: Sequence[int]) -> None:
+        #a passive-aggressive pairwise ranking step that pushes the best scoring
+        #memory with the correct value above the best scoring memory overall
+        F = self._features(x, mems)
+        s = F @ self._weights
+        Y = self._bank.y[mems]
+
+        best = int(np.argmax(s))
+        if Y[best] == y or not (Y == y).any(): return
+
+        good = int(np.argmax(np.where(Y == y, s, -np.inf)))
+        diff = F[good] - F[best]
+        loss = 1 - (s[good] - s[best])
+        norm = diff @ diff
+
+        if self._bound: self._evictor.miss(mems[best])
+
+        if loss > 0 and norm > 0:
+            self._weights += min(w, loss/norm) * diff
+            if self._scorer == "self_consistent_rank": np.maximum(self._weights, 0, out=self._weights)
+
+    def _split_leaf(self, leaf: Node) -> None:
+        X = self._bank.X[leaf.mems]
+        v = self._eigen(X) if self._router == "eigen" else self._unit(self._rng.standard_normal(self._dim))
+        p = X @ v
+        b = float(np.median(p))
+
+        go_left = p <= b
+
+        #when many projections equal the median, split just below it instead
+        if go_left.all() and (p < b).any():
+            b       = float(p[p < b].max())
+            go_left = p <= b
+
+        #identical projections (e.g., duplicate memories) can't be split so the
+        #leaf waits until it has doubled before paying for another eigen pass
+        if go_left.all() or not go_left.any():
+            leaf.retry = 2*len(leaf.mems)
+            return
+
+        leaf.router = v
+        leaf.bias   = b
+        leaf.left   = Node(leaf)
+        leaf.right  = Node(leaf)
+
+        for i, left in zip(leaf.mems, go_left):
+            child = leaf.left if left else leaf.right
+            child.mems.append(i)
+            self._leaf_of[i] = child
+
+        leaf.mems = []
+
+    def _eigen(self, X: np.ndarray, iterations: int = 10) -> np.ndarray:
+        C = X - X.mean(axis=0)
+        v = self._unit(self._rng.standard_normal(self._dim).astype(np.float32))
+
+        for _ in range(iterations):
+            u = C.T @ (C @ v)
+            if not u.any(): break
+            v = self._unit(u)
+
+        return v
+
+    def _unit(self, v: np.ndarray) -> np.ndarray:
+        return (v / np.linalg.norm(v)).astype(np.float32)
+
+    def _evict(self) -> None:
+        i    = self._evictor.evict()
+        leaf = self._leaf_of.pop(i)
+        leaf.mems.remove(i)
+        self._bank.remove(i)
+        if not leaf.mems: self._collapse(leaf)
+
+    def _nodes(self) -> Iterable[Node]:
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            yield node
+            if not node.is_leaf: stack.extend([node.left,node.right])
+
+    def _collapse(self, leaf: Node) -> None:
+        #replace the parent of an empty leaf with the leaf's sibling
+        parent = leaf.parent
+        if parent is None: return
+
+        sibling = parent.right if parent.left is leaf else parent.left
+        sibling.parent = parent.parent
+
+        if parent.parent is None:
+            self._root = sibling
+        elif parent.parent.left is parent:
+            parent.parent.left = sibling
+        else:
+            parent.parent.right = sibling
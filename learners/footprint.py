@@ -0,0 +1,48 @@
+"""Sample how much memory a memory learner uses as its memories pile up."""
+
+import os
+import sys
+import resource
+from typing import Any, Mapping
+
+def resident_bytes() -> int:
+    """The resident memory of this process."""
+    try:
+        with open("/proc/self/statm") as f: return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        #without /proc the best we can do is the peak resident memory
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+
+def weight_bytes(mediator: Any) -> int:
+    """The bytes VW allocated for a mediator's weights (0 if it isn't an initialized VW mediator)."""
+    if not hasattr(mediator, "_vw") or not mediator.is_initialized: return 0
+    return mediator._vw.num_weights() * mediator._vw.get_stride() * 4
+
+class FootprintSampler:
+    """Every `every` learns sample resident memory, VW weight memory and the memory count (and bytes)."""
+
+    def __init__(self, every: int = 1000) -> None:
+        self._every   = every
+        self._learned = 0
+
+    def sample(self, mem: Any, *mediators: Any) -> Mapping[str,float]:
+        """Count a learn and return a sample when one is due (otherwise an empty dict).
+
+        Args:
+            mem: The VWC memory being learned. Without a tracked memory count every learn is
+                assumed to add a memory, which holds for unbounded EMT and CMT.
+            mediators: Any other VW mediators owned by the learner (e.g., StackedLearner's).
+        """
+        self._learned += 1
+
+        if self._learned % self._every: return {}
+
+        #footprint can be a round trip to other processes (e.g., ShardedEMT) so it is only read here
+        footprint = mem.footprint
+
+        return {
+            'rss_mb'  : resident_bytes()/2**20,
+            'vw_mb'   : sum(map(weight_bytes, [getattr(mem, '_vw', None), *mediators]))/2**20,
+            'memories': footprint.get('memories', self._learned),
+            **({'memory_bytes': footprint['memory_bytes']} if 'memory_bytes' in footprint else {}),
+        }
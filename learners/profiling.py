@@ -0,0 +1,128 @@
+"""Nanosecond latency profiling for VWC learners."""
+
+from time import perf_counter_ns
+from typing import Mapping, Any, Callable, Dict, List
+
+from coba.context import CobaContext
+
+class LatencyHistogram:
+    """A streaming log-linear histogram of nanosecond latencies.
+
+    Values are binned into 8 buckets per power of two so percentiles are within 12.5%
+    of the true value while memory stays constant no matter how many values are seen.
+    """
+
+    def __init__(self) -> None:
+        self._counts: List[int] = []
+        self.n     = 0
+        self.total = 0
+        self.max   = 0
+
+    def record(self, ns: int) -> None:
+        i = ns if ns < 16 else 8*(ns.bit_length()-4) + (ns >> (ns.bit_length()-4))
+
+        if i >= len(self._counts): self._counts.extend([0]*(i+1-len(self._counts)))
+
+        self._counts[i] += 1
+        self.n          += 1
+        self.total      += ns
+        self.max         = max(self.max, ns)
+
+    def percentile(self, p: float) -> int:
+        """The upper bound of the bucket holding the p-th percentile (0 <= p <= 100)."""
+        if not self.n: return 0
+
+        target = p/100*self.n
+        seen   = 0
+        for i, count in enumerate(self._counts):
+            seen += count
+            if count and seen >= target: return min(self._upper(i), self.max)
+
+        return self.max
+
+    @property
+    def mean(self) -> float:
+        return self.total/self.n if self.n else 0
+
+    def merge(self, other: 'LatencyHistogram') -> 'LatencyHistogram':
+        """Add the values of another histogram to this one (e.g., one from another process)."""
+        if len(other._counts) > len(self._counts): self._counts.extend([0]*(len(other._counts)-len(self._counts)))
+
+        for i, count in enumerate(other._counts): self._counts[i] += count
+
+        self.n     += other.n
+        self.total += other.total
+        self.max    = max(self.max, other.max)
+        return self
+
+    def _upper(self, i: int) -> int:
+        if i < 16: return i
+        e, m = i//8-1, i%8+8
+        return ((m+1) << e) - 1
+
+def coba_sink(summary: Mapping[str,Mapping[str,float]]) -> None:
+    """Add a profiler summary (in microseconds) to the interaction coba is about to log."""
+    CobaContext.learning_info.update({ f"{phase}_{stat}_us": value/1000 for phase,stats in summary.items() for stat,value in stats.items() if stat != 'n' })
+
+class Profiler:
+    """Collect per phase latency histograms and periodically send their summary to a sink."""
+
+    def __init__(self, sink: Callable[[Mapping[str,Mapping[str,float]]],None] = coba_sink, every: int = 1000, percentiles: List[float] = [50,90,99]) -> None:
+        """
+        Args:
+            sink: Receives the summary of every phase's latencies.
+            every: The number of learn calls between sends to the sink.
+            percentiles: The percentiles to include in each summary.
+        """
+        self._sink        = sink
+        self._every       = every
+        self._percentiles = percentiles
+        self._phases      : Dict[str,LatencyHistogram] = {}
+        self._learns      = 0
+
+    def record(self, phase: str, ns: int) -> None:
+        histogram = self._phases.get(phase)
+        if histogram is None: histogram = self._phases[phase] = LatencyHistogram()
+        histogram.record(ns)
+
+        if phase == "vw_learn":
+            self._learns += 1
+            if self._sink and self._learns % self._every == 0: self._sink(self.summary())
+
+    def summary(self) -> Mapping[str,Mapping[str,float]]:
+        summary = {}
+        for phase, histogram in self._phases.items():
+            summary[phase] = {'n': histogram.n, 'mean': histogram.mean, 'max': histogram.max}
+            summary[phase].update({ f"p{p:g}": histogram.percentile(p) for p in self._percentiles })
+        return summary
+
+    def timed(self, phase: str, func: Callable) -> Callable:
+        """Wrap a callable so each call's latency is recorded under phase."""
+        def timed_func(*args, **kwargs):
+            start  = perf_counter_ns()
+            result = func(*args, **kwargs)
+            self.record(phase, perf_counter_ns()-start)
+            return result
+        return timed_func
+
+class ProfiledMediator:
+    """Forward everything to a mediator while timing its predict and learn calls."""
+
+    def __init__(self, mediator: Any, profiler: Profiler) -> None:
+        self._mediator = mediator
+        self.predict   = profiler.timed("vw_predict", mediator.predict)
+        self.learn     = profiler.timed("vw_learn"  , mediator.learn)
+
+        if hasattr(mediator, "predict_batch"):
+            self.predict_batch = profiler.timed("vw_predict_batch", mediator.predict_batch)
+
+    @property
+    def mediator(self) -> Any:
+        return self._mediator
+
+    def __reduce_ex__(self, protocol):
+        #pickle as the wrapped mediator since profiling is restored by the learner
+        return self._mediator.__reduce_ex__(protocol)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._mediator, name)
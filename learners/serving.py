@@ -0,0 +1,172 @@
+"""An asyncio front-end that serves an EpisodicLearner or StackedLearner to concurrent callers."""
+
+import asyncio
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Deque, Hashable, Mapping, Sequence, Tuple
+
+from learners.profiling import LatencyHistogram
+
+class MicroBatchServer:
+    """Gather concurrent predicts into micro-batches and apply learns in the background.
+
+    VW isn't thread safe so every call into the learner is made by one worker thread. Each
+    batch of predicts costs one hop to that thread and is sent once it holds `max_batch`
+    requests or its oldest request has waited `max_delay` seconds. A learner with
+    `predict_many` answers a batch with one memory query, which only shares work for the
+    numpy EMT engine (VW's emt reduction predicts one example per call). Learns return as soon
+    as they are queued and are applied while no predicts are waiting, unless more than
+    `max_backlog` learns are queued, in which case a chunk is applied between batches.
+
+    A learn that raises is counted in `metrics` and skipped so one bad learn can't stop
+    the server. Predicts still waiting when the server stops fail with a RuntimeError.
+    """
+
+    def __init__(self, learner: Any, max_batch: int = 32, max_delay: float = 0.002, max_backlog: int = 1024, learn_chunk: int = 64) -> None:
+        """
+        Args:
+            learner: An EpisodicLearner or StackedLearner (or anything with their predict/learn).
+            max_batch: The most predicts to send to the learner at once.
+            max_delay: The most seconds a predict will wait for its batch to fill.
+            max_backlog: The number of queued learns at which learns go ahead of predicts.
+            learn_chunk: The most learns applied in one hop to the worker thread.
+        """
+        self._learner     = learner
+        self._max_batch   = max_batch
+        self._max_delay   = max_delay
+        self._max_backlog = max_backlog
+        self._learn_chunk = learn_chunk
+
+        self._predicts: Deque[Tuple[float,asyncio.Future,tuple]] = deque()
+        self._learns  : Deque[Tuple[tuple,Mapping[str,Any]]]     = deque()
+        self._batches  = LatencyHistogram()
+        self._learned  = 0
+        self._failed   = 0
+        self._worker   = None
+        self._executor = None
+        self._wake     = None
+
+    async def __aenter__(self) -> 'MicroBatchServer':
+        self.start()
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.stop()
+
+    @property
+    def metrics(self) -> Mapping[str,float]:
+        """Current queue depths and the distribution of predict batch sizes so far."""
+        return {
+            'predict_queue': len(self._predicts),
+            'learn_queue'  : len(self._learns),
+            'batches'      : self._batches.n,
+            'batch_mean'   : self._batches.mean,
+            'batch_p50'    : self._batches.percentile(50),
+            'batch_max'    : self._batches.max,
+            'learned'      : self._learned,
+            'learn_errors' : self._failed,
+        }
+
+    def start(self) -> None:
+        self._executor = ThreadPoolExecutor(1, thread_name_prefix="learner")
+        self._wake     = asyncio.Event()
+        self._worker   = asyncio.get_running_loop().create_task(self._serve())
+
+    async def stop(self) -> None:
+        """Apply every queued learn, fail every unserved predict and then shut down."""
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+
+        while self._predicts: self._fail([self._predicts.popleft()])
+        while self._learns: await self._apply_learns()
+        self._executor.shutdown()
+
+    async def predict(self, context: Hashable, actions: Sequence[Hashable]) -> Tuple[Sequence[float],Mapping[str,Any]]:
+        """The learner's (probabilities, info) for context and actions."""
+        future = asyncio.get_running_loop().create_future()
+        self._predicts.append((asyncio.get_running_loop().time(), future, (context, actions)))
+        self._wake.set()
+        return await future
+
+    def learn(self, context: Hashable, action: Hashable, reward: float, probability: float, **info) -> None:
+        """Queue feedback for the learner (info is what predict returned)."""
+        self._learns.append(((context, action, reward, probability), info))
+        self._wake.set()
+
+    async def _serve(self) -> None:
+        loop = asyncio.get_running_loop()
+
+        while True:
+            if not self._predicts and not self._learns:
+                self._wake.clear()
+                await self._wake.wait()
+
+            if self._predicts and len(self._learns) <= self._max_backlog:
+                deadline = self._predicts[0][0] + self._max_delay
+
+                while len(self._predicts) < self._max_batch and loop.time() < deadline:
+                    self._wake.clear()
+                    try:
+                        await asyncio.wait_for(self._wake.wait(), deadline-loop.time())
+                    except asyncio.TimeoutError:
+                        break
+
+                await self._apply_predicts()
+            else:
+                await self._apply_learns()
+
+    async def _apply_predicts(self) -> None:
+        batch = [ self._predicts.popleft() for _ in range(min(self._max_batch,len(self._predicts))) ]
+        self._batches.record(len(batch))
+
+        try:
+            results = await asyncio.get_running_loop().run_in_executor(self._executor, self._predict_batch, [b[2] for b in batch])
+        except BaseException:
+            #the batch has left the queue so stop can't see it (e.g., the server stopped mid batch)
+            self._fail(batch)
+            raise
+
+        for (_, future, _), (ok, result) in zip(batch, results):
+            if future.cancelled(): continue
+            if ok: future.set_result(result)
+            else: future.set_exception(result)
+
+    async def _apply_learns(self) -> None:
+        batch = [ self._learns.popleft() for _ in range(min(self._learn_chunk,len(self._learns))) ]
+        failed = await asyncio.get_running_loop().run_in_executor(self._executor, self._learn_batch, batch)
+        self._learned += len(batch) - failed
+        self._failed  += failed
+
+    def _fail(self, batch: Sequence[Tuple[float,asyncio.Future,tuple]]) -> None:
+        for _, future, _ in batch:
+            if not future.done(): future.set_exception(RuntimeError("The server stopped before this predict was served."))
+
+    def _predict_batch(self, requests: Sequence[tuple]) -> Sequence[Tuple[bool,Any]]:
+        #a learner with predict_many answers the whole batch with one memory query
+        if hasattr(self._learner, "predict_many"):
+            try:
+                return [ (True, result) for result in self._learner.predict_many(requests) ]
+            except Exception:
+                pass #the batch is retried one request at a time to find the request that failed
+
+        #one failed request shouldn't fail the rest of its batch
+        results = []
+        for request in requests:
+            try:
+                results.append((True, self._learner.predict(*request)))
+            except Exception as e:
+                results.append((False, e))
+        return results
+
+    def _learn_batch(self, learns: Sequence[Tuple[tuple,Mapping[str,Any]]]) -> int:
+        #one failed learn shouldn't lose the rest of its chunk (or stop the server)
+        failed = 0
+        for args, info in learns:
+            try:
+                self._learner.learn(*args, **info)
+            except Exception:
+                failed += 1
+        return failed
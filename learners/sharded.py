@@ -0,0 +1,177 @@
+"""An EMT memory split across several trees that are queried in parallel."""
+
+import multiprocessing as mp
+from zlib import crc32
+from collections import Counter
+from typing import Any, Mapping, Sequence, Tuple
+
+import numpy as np
+
+from learners import EMT, MemVal
+from learners.eigen import named_features
+
+def _shard_main(conn, emt_args: Mapping[str,Any]) -> None:
+    #a shard's EMT is built in its own process so VW never has to be pickled
+    emt   = EMT(**emt_args)
+    error = None
+
+    while True:
+        op, args = conn.recv()
+
+        if op == "close": break
+
+        try:
+            result = getattr(emt, op)(*args) if op != "footprint" else emt.footprint
+        except Exception as e:
+            result, error = None, error or e
+
+        #learns are fire and forget so their errors are raised by the next reply
+        if op != "learn":
+            conn.send((result, error))
+            error = None
+
+class LocalShard:
+    """A shard that runs in the calling process."""
+
+    def __init__(self, emt_args: Mapping[str,Any]) -> None:
+        self._emt    = EMT(**emt_args)
+        self._result = None
+
+    def send(self, op: str, *args) -> None:
+        self._result = getattr(self._emt, op)(*args) if op != "footprint" else self._emt.footprint
+
+    def recv(self) -> Any:
+        return self._result
+
+    def close(self) -> None:
+        pass
+
+class ProcessShard:
+    """A shard that runs in a child process and is talked to over a pipe."""
+
+    def __init__(self, emt_args: Mapping[str,Any]) -> None:
+        self._conn, child = mp.Pipe()
+        self._process     = mp.Process(target=_shard_main, args=(child, emt_args), daemon=True)
+        self._process.start()
+        child.close()
+
+    def send(self, op: str, *args) -> None:
+        self._conn.send((op, args))
+
+    def recv(self) -> Any:
+        result, error = self._conn.recv()
+        if error is not None: raise error
+        return result
+
+    def close(self) -> None:
+        if self._process.is_alive():
+            self._conn.send(("close", ()))
+            self._process.join()
+
+class ShardedEMT:
+    """K EMT shards behind the VWC memory interface.
+
+    Each memory is stored in one shard chosen by its context. The `hash` router spreads
+    contexts uniformly. The `kmeans` router keeps an online k-means centroid per shard so
+    similar contexts share a shard. Queries go to every shard at once and the answers are
+    merged by a vote where each shard is weighted by its memory count (and, for `kmeans`,
+    by how much farther its centroid is from the context than the nearest centroid).
+
+    Shards run in child processes unless `processes` is False or the current process is
+    daemonic (e.g., a coba worker), since daemonic processes can't start children.
+    """
+
+    def __init__(self, shards: int = 4, router: str = "hash", processes: bool = True, **emt_args) -> None:
+
+        if router not in ["hash", "kmeans"]:
+            raise ValueError(f"Unknown shard router {router}.")
+
+        self._args      = (shards, router, processes)
+        self._emt_args  = emt_args
+        self._shards    = []
+        self._counts    = np.zeros(shards)
+        self._centroids = None
+
+    def __reduce__(self):
+        #shards are started by set_params so unstarted learners pickle cheaply
+        return (_make_sharded, (self._args, self._emt_args))
+
+    @property
+    def params(self) -> Mapping[str,Any]:
+        shards, router, _ = self._args
+        return { **EMT(**self._emt_args).params, 'type': 'ShardedEMT', 'shards': shards, 'shard_router': router }
+
+    @property
+    def footprint(self) -> Mapping[str,int]:
+        totals = Counter()
+        for footprint in self._fan_out("footprint"): totals.update(footprint)
+        return dict(totals)
+
+    def set_params(self, actions: Sequence[Any]) -> None:
+        if not self._shards:
+            shards, _, processes = self._args
+            Shard = ProcessShard if processes and not mp.current_process().daemon else LocalShard
+            self._shards = [ Shard(self._emt_args) for _ in range(shards) ]
+
+        self._fan_out("set_params", actions)
+
+    def predict(self, features: Mapping) -> MemVal:
+        return self._vote(self._fan_out("predict", features), features.get('x'))
+
+    def predict_batch(self, context: Any, actions: Sequence[Any]) -> Sequence[MemVal]:
+        answers = self._fan_out("predict_batch", context, actions)
+        return [ self._vote(votes, context) for votes in zip(*answers) ]
+
+    def predict_many(self, queries: Sequence[Tuple[Any,Sequence[Any]]]) -> Sequence[Sequence[MemVal]]:
+        answers = self._fan_out("predict_many", queries)
+        return [ [ self._vote(votes, context) for votes in zip(*query) ] for (context,_), query in zip(queries, zip(*answers)) ]
+
+    def learn(self, features: Mapping, value: Any, weight: float) -> None:
+        i = self._route(features.get('x'))
+        self._counts[i] += 1
+        self._shards[i].send("learn", features, value, weight)
+
+    def close(self) -> None:
+        for shard in self._shards: shard.close()
+        self._shards = []
+
+    def _fan_out(self, op: str, *args) -> Sequence[Any]:
+        #send to every shard before receiving from any so the shards work in parallel
+        for shard in self._shards: shard.send(op, *args)
+        return [ shard.recv() for shard in self._shards ]
+
+    def _vote(self, answers: Sequence[MemVal], context: Any) -> MemVal:
+        votes = Counter()
+        for answer, weight in zip(answers, self._weights(context)): votes[answer] += weight
+        return max(votes, key=votes.get) if votes else answers[0]
+
+    def _weights(self, context: Any) -> np.ndarray:
+        if self._args[1] == "hash" or self._centroids is None or len(self._centroids) < self._args[0]: return self._counts
+        #a shard twice as far from the context as the nearest shard counts e^-4 as much
+        d = np.linalg.norm(self._centroids - self._vector(context), axis=1)
+        return self._counts * np.exp(-4*(d/max(d.min(),1e-9)-1))
+
+    def _route(self, context: Any) -> int:
+        shards, router, _ = self._args
+
+        if router == "hash":
+            return crc32(repr(context).encode()) % shards
+
+        x = self._vector(context)
+
+        #the first K contexts seed the centroids
+        if self._centroids is None or len(self._centroids) < shards:
+            self._centroids = x[None,:] if self._centroids is None else np.vstack([self._centroids, x])
+            return len(self._centroids)-1
+
+        i = int(np.argmin(np.linalg.norm(self._centroids - x, axis=1)))
+        self._centroids[i] += (x - self._centroids[i]) / (self._counts[i]+1)
+        return i
+
+    def _vector(self, context: Any, bits: int = 8) -> np.ndarray:
+        x = np.zeros(2**bits)
+        for name, value in named_features(context): x[crc32(name.encode()) % 2**bits] += value
+        return x
+
+def _make_sharded(args: tuple, emt_args: Mapping[str,Any]) -> ShardedEMT:
+    return ShardedEMT(*args, **emt_args)
@@ -1,23 +1,28 @@
 from learners import EMT, StackedLearner
+from experiments import load_environments, export_result, run_lockstep
 import coba as cb
 
 n_shuffle = 20 #To reproduce the EMT paper results set this to 20
 processes = 10
 epsilon   = 0.1
+lockstep  = False #read each environment once for all learners instead of once per learner
 
 if __name__ == '__main__':
 
     #the learners we wish to test
     learners = [
         cb.VowpalEpsilonLearner(epsilon, features=["a","xa"]),
-        StackedLearner         (epsilon, EMT(bound=1000 , scorer="self_consistent_rank", router="eigen", split=300,  interactions=['xa'], weight=False), "xa", False, True),
-        StackedLearner         (epsilon, EMT(bound=2000 , scorer="self_consistent_rank", router="eigen", split=300,  interactions=['xa'], weight=False), "xa", False, True),
-        StackedLearner         (epsilon, EMT(bound=16000, scorer="self_consistent_rank", router="eigen", split=300,  interactions=['xa'], weight=False), "xa", False, True),
-        StackedLearner         (epsilon, EMT(bound=32000, scorer="self_consistent_rank", router="eigen", split=300,  interactions=['xa'], weight=False), "xa", False, True),
+        StackedLearner         (epsilon, EMT(bound=1000 , scorer="self_consistent_rank", router="eigen", split=300,  interactions=['xa'], weight=False), "xa", False, True).track(),
+        StackedLearner         (epsilon, EMT(bound=2000 , scorer="self_consistent_rank", router="eigen", split=300,  interactions=['xa'], weight=False), "xa", False, True).track(),
+        StackedLearner         (epsilon, EMT(bound=16000, scorer="self_consistent_rank", router="eigen", split=300,  interactions=['xa'], weight=False), "xa", False, True).track(),
+        StackedLearner         (epsilon, EMT(bound=32000, scorer="self_consistent_rank", router="eigen", split=300,  interactions=['xa'], weight=False), "xa", False, True).track(),
     ]
 
     description = "Experiments with bounded memory on EMT."
     log         = "./results/bounded.log.gz"
-    env         = cb.Environments.from_template("./environments/feurer.json", n_take=32_000, strict=True, n_shuffle=n_shuffle)
+    env         = load_environments("./environments/feurer.json", n_take=32_000, strict=True, n_shuffle=n_shuffle)
 
-    cb.Experiment(env, learners, description=description).run(log,processes=processes)
+    #tasks are started longest first using the timings of earlier runs in ./results/bounded.tasks.jsonl
+    run_lockstep(env, learners, log, processes=processes, group=None if lockstep else 1, description=description)
+
+    export_result(log)
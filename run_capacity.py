@@ -1,23 +1,31 @@
 from learners import EMT, EpisodicLearner
+from experiments import load_environments, export_result, successive_halving, run_lockstep
 
 import coba as cb
 
 n_shuffle = 20
 processes = 14
 epsilon   = 0.1
+sweep     = False #drop the worst splits on growing prefixes instead of running all of them to completion
 
 if __name__ == '__main__':
 
    learners = [
-      EpisodicLearner (epsilon, EMT(split=25 , scorer="self_consistent_rank", router="eigen", interactions=["xa"], weight=False)),
-      EpisodicLearner (epsilon, EMT(split=50 , scorer="self_consistent_rank", router="eigen", interactions=["xa"], weight=False)),
-      EpisodicLearner (epsilon, EMT(split=100, scorer="self_consistent_rank", router="eigen", interactions=["xa"], weight=False)),
-      EpisodicLearner (epsilon, EMT(split=200, scorer="self_consistent_rank", router="eigen", interactions=["xa"], weight=False)),
-      EpisodicLearner (epsilon, EMT(split=300, scorer="self_consistent_rank", router="eigen", interactions=["xa"], weight=False)),
+      EpisodicLearner (epsilon, EMT(split=25 , scorer="self_consistent_rank", router="eigen", interactions=["xa"], weight=False)).track(),
+      EpisodicLearner (epsilon, EMT(split=50 , scorer="self_consistent_rank", router="eigen", interactions=["xa"], weight=False)).track(),
+      EpisodicLearner (epsilon, EMT(split=100, scorer="self_consistent_rank", router="eigen", interactions=["xa"], weight=False)).track(),
+      EpisodicLearner (epsilon, EMT(split=200, scorer="self_consistent_rank", router="eigen", interactions=["xa"], weight=False)).track(),
+      EpisodicLearner (epsilon, EMT(split=300, scorer="self_consistent_rank", router="eigen", interactions=["xa"], weight=False)).track(),
    ]
 
    description = "Experiments with varying levels of c."
    log         = "./results/capacity.log.gz"
-   env         = cb.Environments.from_template("./environments/feurer.json", n_shuffle=n_shuffle)
+   env         = load_environments("./environments/feurer.json", n_shuffle=n_shuffle)
 
-   cb.Experiment(env, learners, cb.OnPolicyEvaluator(['reward','time']), description=description,).run(log,processes=processes)
+   if sweep:
+      successive_halving(env, learners, log, rounds=[500,1000], keep=0.5, evaluator=cb.OnPolicyEvaluator(['reward','time']), processes=processes, description=description)
+   else:
+      #tasks are started longest first using the timings of earlier runs in ./results/capacity.tasks.jsonl
+      run_lockstep(env, learners, log, cb.OnPolicyEvaluator(['reward','time']), processes=processes, group=1, description=description)
+
+   export_result(log)
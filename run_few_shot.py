@@ -1,11 +1,15 @@
+import os
+import sys
 import time
-import bisect
-from subprocess import Popen, PIPE, STDOUT
+from array import array
+from collections import defaultdict
 from pathlib import Path
+from typing import Sequence, Tuple
 
 import coba as cb
 
 from learners import EMT, CMT, VWC
+from jobs import Job, Scheduler, VWCache, vw_summary, vw_memory
 
 def evaluator(learner: VWC, interactions):
     
@@ -16,13 +20,13 @@ def evaluator(learner: VWC, interactions):
         key = {'x':interaction['context']}
         true_action = interaction['rewards'].argmax()
 
-        start = time.time()
+        start = time.perf_counter()
         pred_action = learner.predict(key)
-        pred_time = time.time()-start
+        pred_time = time.perf_counter()-start
 
-        start = time.time()
+        start = time.perf_counter()
         learner.learn(key, true_action , 1)
-        learn_time = time.time()-start
+        learn_time = time.perf_counter()-start
         
         yield {'reward': int(str(pred_action) == true_action), 'pred_time':pred_time, 'learn_time':learn_time, 'total_time': pred_time+learn_time }
 
@@ -34,26 +38,25 @@ class NShot:
     def filter(self, interactions):
 
         rng = cb.CobaRandom(self._seed)
-        get_label = lambda i: i['rewards'].argmax()
 
-        interactions  = sorted(interactions, key=get_label)        
-        class_indexes = []
+        #a single pass buckets interaction indexes by label (no sorted copy of the data)
+        interactions = list(interactions)
+        buckets      = defaultdict(lambda: array('l'))
 
-        lo = 0
-        hi = len(interactions)
+        for index, interaction in enumerate(interactions):
+            buckets[interaction['rewards'].argmax()].append(index)
 
-        while lo != hi:
-            new_lo = bisect.bisect_right(interactions, get_label(interactions[lo]), lo, hi, key=get_label)
-            class_indexes.append(rng.shuffle(list(range(lo,new_lo)),inplace=True))
-            lo = new_lo
+        #shuffling buckets in label order keeps the output identical to the old sort based sampler
+        class_indexes = [ rng.shuffle(buckets.pop(label), inplace=True) for label in sorted(buckets) ]
 
         for _ in range(self._n):
             for indexes in rng.shuffle(class_indexes,inplace=True):
-                yield interactions[indexes.pop()]            
+                yield interactions[indexes.pop()]
 
 if __name__ == "__main__":
 
     n_processes = 1
+    n_scorers   = os.cpu_count() #the forked workers that score each --testonly model on its test file
     n_shuffle   = 10
     log         = 'few_shot.log.gz' 
 
@@ -73,7 +76,9 @@ if __name__ == "__main__":
     #for the rest of this file:
     #   datasets for these experiments can be found at http://kalman.ml.cmu.edu/wen_datasets/
     #   the experiment assumes all data sets are stored in a ./data/ directory.
-    #   you should also make a ./caches/ and ./models/ directory for outputs from this experiment
+    #   you should also make a ./models/ directory for outputs from this experiment
+    #   each train and test file is parsed once into a shared cache in ./caches/ that every model on it reads
+    #   per-job timings, peak memory and test error are appended to ./results/few_shot_jobs.jsonl
     datasets = {
         "aloi":{"train":"aloi_train.vw"                    , "test": "aloi_test.vw"                    , "classes":1_000 },
         "par1":{"train":"paradata10000_one_shot.vw.train"  , "test": "paradata10000_one_shot.vw.test"  , "classes":10_000},
@@ -136,83 +141,55 @@ if __name__ == "__main__":
         ['img5_rt' , datasets['img5'], 2, '--recall_tree 21850', '--testonly'],
     ]
 
-    def wait_one(workers):
-        while True:
-            time.sleep(5)
-            for i,worker in enumerate(workers):
-                if worker.poll() is not None:
-                    return i
-
-    is_training = lambda item: len(item) == 5
-    is_testing  = lambda item: len(item) == 3
-    is_finished = lambda item: len(item) == 2
-
-    already_trained  = lambda item: Path(f"./models/{item[0]}").exists()
-
-    def map_to_testing_item(item): del item[2:4]
-
-    def print_worker(worker,workitem):
-        if is_testing(workitem):
-            print(f"Finished Training {workitem[0]}")
-
-        if is_finished(workitem):
-            output = worker.communicate()[0].splitlines()
-            try:                    
-                usr_time = float(output[-2][5:])
-                sys_time = float(output[-1][4:])
-                tot_time = usr_time+sys_time
-            except:
-                tot_time = 0
-            
-            try:
-                n_examples = float(output[-8][21:])
-            except:
-                n_examples = 1
-
-            try:
-                error = float(output[-5][14:])
-            except:
-                error = 0
-            print(f"Finished Testing {workitem[0]} {round(tot_time,3)} {round(1000*tot_time/n_examples,5)} {round(error,4)}")
-
-    workers = []
-    working = []
-
-    while not all(map(is_finished,items)):
-
-        for item in items:
-
-            if is_finished(item):
-                continue
-
-            if already_trained(item) and is_training(item):
-                map_to_testing_item(item)
-
-            if item not in working:
-                if is_training(item):
-                    model  = item[0]
-                    train  = item[1]['train']
-                    passes = item.pop(2)
-                    args   = item.pop(2)
-                    print(f"Started Training {model}")
-                    cmd    = f'vw ./data/{train} -f ./models/{model} {args} -b 29 --random_seed 1337 --holdout_off --passes {passes} --cache --cache_file ./caches/{model}.cache --quiet'
-
-                elif is_testing(item):
-                    model = item[0]
-                    test  = item[1]['test']
-                    args  = item.pop(2)
-                    print(f"Started Testing {model}")
-                    cmd = f'time -p vw ./data/{test} -i ./models/{model} {args}'
-
-                workers.append(Popen(cmd,shell=True,stdout=PIPE,stderr=STDOUT,encoding='utf8'))
-                working.append(item)
-
-            #Wait for workers to finish if we're currently using all of our 
-            #processes or if we're already working on all remaining items
-            if len(workers) == n_processes or all(i in working for i in items if not is_finished(i)):
-                i = wait_one(workers)
-                print_worker(workers.pop(i),working.pop(i))
-
-    while workers:
-        i = wait_one(workers)
-        print_worker(workers.pop(i),working.pop(i))
+    def size(file: str) -> int:
+        path = Path(f"./data/{file}")
+        return path.stat().st_size if path.exists() else 0
+
+    def test_summary(output: str):
+        summary = vw_summary(output)
+        return {'examples': float(summary.get('number of examples',0)), 'error': float(summary.get('average loss',0)) }
+
+    jobs   = []
+    caches = {}
+
+    def cache(file: str, args: str) -> Tuple[VWCache, Sequence[Job]]:
+        """The shared cache of a data file for a model's args and the job building it (if it must be built)."""
+        shared = VWCache(f"./data/{file}", args)
+
+        if shared.path not in caches:
+            reason = shared.stale()
+            caches[shared.path] = [shared.job()] if reason else []
+            jobs.extend(caches[shared.path])
+            if reason: print(f"Building {shared.path} ({reason})")
+
+        return shared, caches[shared.path]
+
+    for model, dataset, passes, train_args, test_args in items:
+
+        train = []
+
+        if not Path(f"./models/{model}").exists():
+            train_cache, build = cache(dataset['train'], f"{train_args} -b 29")
+            cmd   = f'vw --cache_file {train_cache.path} -f ./models/{model} {train_args} -b 29 --random_seed 1337 --holdout_off --passes {passes} --quiet'
+            train = [Job(f"{model}_train", cmd, cost=passes*size(dataset['train']), memory=vw_memory(29), after=build)]
+            jobs.extend(train)
+
+        if '--testonly' in test_args:
+            #frozen models are scored by forked workers sharing one loaded copy of the model
+            cmd = f'{sys.executable} -m jobs.score ./models/{model} ./data/{dataset["test"]} --workers {n_scorers}'
+            jobs.append(Job(f"{model}_test", cmd, cost=size(dataset['test']), memory=vw_memory(29), cores=n_scorers, after=train, summarize=test_summary))
+        else:
+            test_cache, build = cache(dataset['test'], f"{train_args} -b 29")
+            cmd = f'vw --cache_file {test_cache.path} -i ./models/{model} {test_args}'
+            jobs.append(Job(f"{model}_test", cmd, cost=size(dataset['test']), memory=vw_memory(29), after=[*train, *build], summarize=test_summary))
+
+    for record in Scheduler(records='./results/few_shot_jobs.jsonl').run(jobs):
+        if record['status'] == 'skipped':
+            print(f"Skipped {record['job']} ({record['reason']})")
+        elif record['status'] == 'failed':
+            print(f"Failed {record['job']} (see ./logs/{record['job']}.log)")
+        elif 'examples' not in record:
+            print(f"Finished {record['job']} {round(record['wall'],3)}")
+        else:
+            tot_time = record['user']+record['sys']
+            print(f"Finished {record['job']} {round(tot_time,3)} {round(1000*tot_time/max(record['examples'],1),5)} {round(record['error'],4)} {record['max_rss']}")
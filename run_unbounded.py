@@ -1,9 +1,11 @@
 from learners import EMT, CMT, EpisodicLearner, StackedLearner
+from experiments import load_environments, export_result, run_lockstep
 import coba as cb
 
 n_shuffle = 20 #To reproduce the EMT paper set this to 20
 processes = 14
 epsilon   = 0.1
+lockstep  = False #read each environment once for all learners instead of once per learner
 
 if __name__ == '__main__':
 
@@ -30,6 +32,9 @@ if __name__ == '__main__':
 
    description = "Experiments with unbounded memory on EMT."
    log         = "./results/unbounded.log.gz"
-   env         = cb.Environments.from_template("./environments/feurer.json", n_shuffle=n_shuffle)
+   env         = load_environments("./environments/feurer.json", n_shuffle=n_shuffle)
 
-   cb.Experiment(env, learners, description=description).run(log,processes=processes)
+   #tasks are started longest first using the timings of earlier runs in ./results/unbounded.tasks.jsonl
+   run_lockstep(env, learners, log, processes=processes, group=None if lockstep else 1, description=description)
+
+   export_result(log)
@@ -0,0 +1,73 @@
+import unittest
+import tempfile
+
+from pathlib import Path
+
+import coba as cb
+from coba.context import CobaContext, IndentLogger
+from coba.pipes import ListSink
+
+from experiments.lockstep import run_lockstep
+
+class RaisingLearner:
+    @property
+    def params(self):
+        return {'family': 'raising'}
+
+    def request(self, context, actions, request):
+        raise ValueError("raising learner")
+
+    def predict(self, context, actions):
+        raise ValueError("raising learner")
+
+    def learn(self, context, action, reward, probability, **kwargs):
+        pass
+
+class RaisingEnvironment:
+    @property
+    def params(self):
+        return {'env_type': 'raising'}
+
+    def read(self):
+        raise ValueError("raising environment")
+
+class run_lockstep_Tests(unittest.TestCase):
+
+    def setUp(self) -> None:
+        #coba's default logger only accepts strings so it catches exceptions being logged as objects
+        self.logger        = CobaContext.logger
+        self.sink          = ListSink()
+        CobaContext.logger = IndentLogger(self.sink)
+
+    def tearDown(self) -> None:
+        CobaContext.logger = self.logger
+
+    def test_raising_learner_is_dropped(self):
+        envs     = cb.Environments.from_linear_synthetic(50, n_actions=3, n_context_features=2, n_action_features=0, seed=[1,2])
+        learners = [cb.RandomLearner(), RaisingLearner(), cb.VowpalEpsilonLearner(0.1)]
+
+        for group in [None, 1]:
+            for processes in [1, 2]:
+                with self.subTest(group=group, processes=processes), tempfile.TemporaryDirectory() as tmp:
+                    run_lockstep(envs, learners, str(Path(tmp)/"test.log.gz"), processes=processes, group=group)
+
+                    interactions = cb.Result.from_file(str(Path(tmp)/"test.log.gz")).interactions
+                    self.assertEqual([0,2], sorted(set(interactions['learner_id'])))
+                    self.assertEqual(2*2*50, len(interactions))
+
+                    if processes == 1: self.assertTrue(any("raising learner" in line for line in self.sink.items))
+
+    def test_raising_environment_is_skipped(self):
+        envs     = [RaisingEnvironment(), *cb.Environments.from_linear_synthetic(50, n_actions=3, n_context_features=2, n_action_features=0, seed=1)]
+        learners = [cb.RandomLearner(), cb.VowpalEpsilonLearner(0.1)]
+
+        for processes in [1, 2]:
+            with self.subTest(processes=processes), tempfile.TemporaryDirectory() as tmp:
+                run_lockstep(envs, learners, str(Path(tmp)/"test.log.gz"), processes=processes, group=1)
+
+                interactions = cb.Result.from_file(str(Path(tmp)/"test.log.gz")).interactions
+                self.assertEqual([1], sorted(set(interactions['environment_id'])))
+                self.assertEqual(2*50, len(interactions))
+
+if __name__ == '__main__':
+    unittest.main()
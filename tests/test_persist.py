@@ -0,0 +1,55 @@
+import os
+import pickle
+import tempfile
+import unittest
+
+from coba.random import CobaRandom
+
+from learners import EMT, VWC, StackedLearner
+from learners.profiling import Profiler
+
+def train(learner, n: int = 50):
+    rng     = CobaRandom(1)
+    actions = ['a','b','c']
+    for _ in range(n):
+        context = tuple(rng.randoms(3))
+        probs, info = learner.predict(context, actions)
+        action = actions[rng.randint(0,2)]
+        learner.learn(context, action, rng.randint(0,1), probs[actions.index(action)], **info)
+    return learner
+
+class StackedLearner_Tests(unittest.TestCase):
+
+    def test_persisted_stack_restores_a_memory_that_does_not_persist(self):
+        learner  = train(StackedLearner(.1, EMT(split=10, interactions=['xa']), 'xa', False, True, persist=True))
+        restored = pickle.loads(pickle.dumps(learner))
+
+        context = (.1,.2,.3)
+        self.assertTrue(restored._mem._vw.is_initialized)
+        self.assertEqual(restored._i, learner._i)
+        self.assertEqual(restored._mem.predict_batch(context, ['a','b','c']), learner._mem.predict_batch(context, ['a','b','c']))
+        self.assertEqual(restored.predict(context, ['a','b','c'])[0], learner.predict(context, ['a','b','c'])[0])
+
+    def test_stack_that_does_not_persist_starts_cold(self):
+        restored = pickle.loads(pickle.dumps(train(StackedLearner(.1, EMT(split=10), 'xa', False, True))))
+
+        self.assertEqual(restored._i, 0)
+        self.assertEqual(len(restored.predict((.1,.2,.3), ['a','b','c'])[0]), 3)
+
+class VWC_Tests(unittest.TestCase):
+
+    def test_save_writes_the_model_of_a_profiled_learner(self):
+        mem = EMT(split=10).profile(Profiler(sink=None))
+        mem.set_params(['0','1'])
+        for i in range(20): mem.learn({'x':(i,), 'a':'a'}, str(i%2), 1)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            mem.save(os.path.join(tmp, "emt.pkl"))
+            loaded = VWC.load(os.path.join(tmp, "emt.pkl"))
+
+        self.assertTrue(loaded._vw.is_initialized)
+        self.assertIsNotNone(loaded._profiler)
+        self.assertEqual(loaded.predict({'x':(3,), 'a':'a'}), mem.predict({'x':(3,), 'a':'a'}))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,41 @@
+import tempfile
+import unittest
+
+from jobs import Job, Scheduler
+
+class Scheduler_Tests(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.logs = tempfile.TemporaryDirectory()
+
+    def tearDown(self) -> None:
+        self.logs.cleanup()
+
+    def statuses(self, jobs):
+        return { r['job']: r['status'] for r in Scheduler(processes=1, logs=self.logs.name).run(jobs) }
+
+    def test_dependents_of_a_failed_last_job_are_skipped(self):
+        a = Job('a', 'false')
+        b = Job('b', 'true', after=[a])
+        self.assertEqual(self.statuses([a,b]), {'a':'failed', 'b':'skipped'})
+
+    def test_dependents_of_skipped_jobs_are_skipped(self):
+        a = Job('a', 'false', cost=1)
+        b = Job('b', 'true' , cost=2, after=[a])
+        c = Job('c', 'true' , cost=3, after=[b])
+        d = Job('d', 'true' , cost=0)
+        self.assertEqual(self.statuses([a,b,c,d]), {'a':'failed', 'b':'skipped', 'c':'skipped', 'd':'succeeded'})
+
+    def test_skipped_record_has_reason(self):
+        a = Job('a', 'false')
+        b = Job('b', 'true', after=[a])
+        records = list(Scheduler(logs=self.logs.name).run([a,b]))
+        self.assertEqual(records[-1], {'job': 'b', 'status': 'skipped', 'reason': 'a prerequisite failed'})
+
+    def test_unscheduled_prerequisite_raises(self):
+        a = Job('a', 'true')
+        with self.assertRaises(ValueError):
+            list(Scheduler(logs=self.logs.name).run([Job('b', 'true', after=[a])]))
+
+if __name__ == '__main__':
+    unittest.main()
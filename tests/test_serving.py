@@ -0,0 +1,91 @@
+import time
+import asyncio
+import unittest
+
+from learners.serving import MicroBatchServer
+
+class FlakyLearner:
+    def __init__(self) -> None:
+        self.learned = []
+
+    def predict(self, context, actions):
+        return [1/len(actions)]*len(actions), {}
+
+    def learn(self, context, action, reward, probability, **info):
+        if reward < 0: raise ValueError("bad reward")
+        self.learned.append(context)
+
+class SlowLearner(FlakyLearner):
+    def predict(self, context, actions):
+        time.sleep(.05)
+        return super().predict(context, actions)
+
+class ManyLearner(FlakyLearner):
+    def __init__(self) -> None:
+        super().__init__()
+        self.batches = []
+
+    def predict(self, context, actions):
+        if context < 0: raise ValueError("bad context")
+        return super().predict(context, actions)
+
+    def predict_many(self, requests):
+        self.batches.append(len(requests))
+        return [ self.predict(*request) for request in requests ]
+
+class MicroBatchServer_Tests(unittest.TestCase):
+
+    def test_batch_is_one_predict_many(self):
+        async def run():
+            learner = ManyLearner()
+            async with MicroBatchServer(learner, max_batch=4, max_delay=1) as server:
+                results = await asyncio.gather(*[ server.predict(i, ['a','b']) for i in range(4) ])
+            return learner, results
+
+        learner, results = asyncio.run(run())
+
+        self.assertEqual([4], learner.batches)
+        self.assertEqual([([.5,.5],{})]*4, results)
+
+    def test_failed_predict_many_only_fails_its_request(self):
+        async def run():
+            async with MicroBatchServer(ManyLearner(), max_batch=3, max_delay=1) as server:
+                return await asyncio.gather(*[ server.predict(i, ['a','b']) for i in [1,-1,2] ], return_exceptions=True)
+
+        results = asyncio.run(run())
+
+        self.assertEqual(([.5,.5],{}), results[0])
+        self.assertIsInstance(results[1], ValueError)
+        self.assertEqual(([.5,.5],{}), results[2])
+
+    def test_failed_learn_is_counted_and_skipped(self):
+        async def run():
+            learner = FlakyLearner()
+            async with MicroBatchServer(learner, max_delay=0) as server:
+                server.learn(1, 'a', -1, .5)
+                server.learn(2, 'a', 1, .5)
+                await asyncio.sleep(.05)
+                self.assertEqual(([.5,.5],{}), await asyncio.wait_for(server.predict(3, ['a','b']), 1))
+            return learner, server.metrics
+
+        learner, metrics = asyncio.run(run())
+
+        self.assertEqual([2], learner.learned)
+        self.assertEqual(1, metrics['learn_errors'])
+        self.assertEqual(1, metrics['learned'])
+
+    def test_unserved_predicts_fail_on_stop(self):
+        async def run():
+            server = MicroBatchServer(SlowLearner(), max_batch=1, max_delay=0)
+            server.start()
+            predicts = [ asyncio.ensure_future(server.predict(i, ['a','b'])) for i in range(3) ]
+            await asyncio.sleep(.01)
+            await server.stop()
+            return await asyncio.wait_for(asyncio.gather(*predicts, return_exceptions=True), 1)
+
+        results = asyncio.run(run())
+
+        self.assertTrue(all(isinstance(r, RuntimeError) for r in results[1:]))
+
+if __name__ == '__main__':
+    unittest.main()